@@ -0,0 +1,38 @@
+import os
+import sys
+import time
+import random
+
+SRCPATH = "/src/"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + SRCPATH)
+
+import blueprints
+from tasks import Task, TaskQueue
+
+
+def build_queue(size: int, blueprint: str = "sprint", seed: int = 0) -> TaskQueue:
+    rng = random.Random(seed)
+    taskq = blueprints.BLUEPRINT_MAP[blueprint]()
+
+    for _ in range(size):
+        task = Task.new_task(f"task {rng.randrange(size)}", taskq)
+        for header in taskq.headers:
+            constraint = taskq.find_constraint_fallback(header)
+            if constraint.Variant:
+                task.update_column(header, rng.choice(constraint.Variant.split("|")))
+        taskq.add_task(task)
+
+    return taskq
+
+
+def timed(label: str, func, rows: int, repeat: int = 3) -> float:
+    best = min(_time_once(func) for _ in range(repeat))
+    print(f"{label:<40} {best * 1000:9.2f} ms total {best / rows * 1e9:9.1f} ns/row")
+    return best
+
+
+def _time_once(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
@@ -0,0 +1,42 @@
+import io
+import os
+import time
+import tempfile
+import contextlib
+
+from base import build_queue
+import parsing
+import program
+import main
+
+ROWS = 10_000
+COMMANDS = 50_000
+SAMPLE = 200
+
+
+def run(argv: list[str]) -> float:
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        program.runner(main.program_argument_parser(), argv)
+
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    taskq = build_queue(ROWS)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "taskqueue.csv")
+        commands = os.path.join(tmp, "batch.txt")
+
+        with open(commands, "w") as fp:
+            for i in range(COMMANDS):
+                fp.write(f'add "imported {i}" Priority=High\n')
+
+        # one tqb call per command, every call loads and saves the queue
+        parsing.serialize(path, taskq)
+        per_call = sum(run(["--path", path, "-q", "add", f"imported {i}", "Priority=High"]) for i in range(SAMPLE))
+        print(f"{COMMANDS} adds, one call each (extrapolated) {per_call / SAMPLE * COMMANDS:9.2f} s")
+
+        parsing.serialize(path, build_queue(ROWS))
+        print(f"{COMMANDS} adds in one batch                 {run(['--path', path, '-q', 'batch', commands]):9.2f} s")
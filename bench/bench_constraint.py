@@ -0,0 +1,58 @@
+import fnmatch
+
+from base import build_queue, timed
+import constraints
+
+ROWS = 100_000
+
+
+def legacy_colour(constraint, value):
+    value = str(value)
+    for cpair in constraint.Colours.split("|"):
+        pattern, _, colour = cpair.partition("=")
+        if fnmatch.fnmatch(value.lower(), pattern.lower()):
+            return constraints.colour_code(colour) + value + constraints.Fore.RESET
+    return value
+
+
+def legacy_variant(constraint, value):
+    lvalue = str(value).lower()
+    for variant in constraint.get_variant_constraints():
+        lvariant = variant.lower()
+        if constraint.Autofill and lvariant.startswith(lvalue):
+            return variant
+        if lvariant == lvalue:
+            return variant
+    raise AssertionError(value)
+
+
+def cells(taskq):
+    return [
+        (taskq.find_constraint_fallback(header), value)
+        for task in taskq.tasks.values()
+        for header, value in task.items.items()
+    ]
+
+
+def render(colour, variant, cells):
+    def run():
+        for constraint, value in cells:
+            colour(constraint, value)
+            if constraint.Variant:
+                variant(constraint, value)
+
+    return run
+
+
+if __name__ == "__main__":
+    taskq = build_queue(ROWS)
+    sample = cells(taskq)
+
+    for constraint, value in sample[:1000]:
+        assert legacy_colour(constraint, value) == constraint.apply_colour(value)
+
+    compiled_colour = constraints.Constraint.apply_colour
+    compiled_variant = constraints.Constraint.constrain_variant
+
+    timed("colour + variant per cell (before)", render(legacy_colour, legacy_variant, sample), ROWS)
+    timed("colour + variant per cell (after)", render(compiled_colour, compiled_variant, sample), ROWS)
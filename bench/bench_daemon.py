@@ -0,0 +1,71 @@
+import os
+import io
+import sys
+import time
+import tempfile
+import contextlib
+import subprocess
+
+from base import build_queue
+import daemon
+import parsing
+import program
+import storage
+import main
+
+ROWS = 100_000
+REPEAT = 20
+
+
+def best_of(func, repeat: int = REPEAT) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+if __name__ == "__main__":
+    taskq = build_queue(ROWS)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "taskqueue.csv")
+        socket = os.path.join(tmp, "tqb.sock")
+        parsing.serialize(path, taskq)
+        os.environ["TQB_SOCKET"] = socket
+
+        argv = ["--path", path, "ls"]
+
+        def in_process():
+            with contextlib.redirect_stdout(io.StringIO()):
+                program.runner(main.program_argument_parser(), argv)
+
+        def forwarded():
+            with contextlib.redirect_stdout(io.TextIOWrapper(io.BytesIO())):
+                daemon.forward(argv)
+
+        print(f"ls in process (load + render)    {best_of(in_process, 3) * 1000:9.2f} ms")
+
+        # what the daemon does per request once the queue is resident, for a
+        # 120x40 terminal
+        root = main.program_argument_parser()
+        request = daemon.encode_request(argv, os.getcwd(), "120x40")
+        storage.resident = storage.ResidentQueues()
+        daemon.handle(root, request)
+        print(f"ls handled on a resident queue   {best_of(lambda: daemon.handle(root, request)) * 1000:9.2f} ms")
+        storage.resident = None
+
+        server = subprocess.Popen(
+            [sys.executable, main.__file__, "daemon"], stdout=subprocess.DEVNULL
+        )
+        while not os.path.exists(socket):
+            time.sleep(0.01)
+
+        forwarded()
+        print(f"ls through warm daemon, no tty   {best_of(forwarded) * 1000:9.2f} ms")
+
+        with contextlib.redirect_stdout(io.TextIOWrapper(io.BytesIO())):
+            daemon.forward(["daemon", "--stop"])
+        server.wait()
@@ -0,0 +1,71 @@
+import fnmatch
+
+from base import build_queue, timed
+import query
+
+ROWS = 100_000
+WHERE = ["Status=In Progress", "Sprint=H2 Oct"]
+WHEREOR = ["Priority=h", "Priority=m"]
+SEARCH = "task 1"
+
+
+def legacy_filter(taskq):
+    where = [clause.partition("=") for clause in WHERE]
+    whereor = [clause.partition("=") for clause in WHEREOR]
+    pat = f"*{SEARCH.lower()}*"
+
+    def run():
+        matched = 0
+        for task in taskq.tasks.values():
+            if not any(task.matchi(c, v) for c, _, v in whereor):
+                continue
+            if not all(task.matchi(c, v) for c, _, v in where):
+                continue
+            if not any(fnmatch.fnmatch(str(v).lower(), pat) for v in task.items.values()):
+                continue
+            matched += 1
+        return matched
+
+    return run
+
+
+def compiled_filter(taskq):
+    def run():
+        predicate = query.compile_filter(taskq, WHERE, WHEREOR, SEARCH)
+        return sum(1 for _ in filter(predicate, taskq.tasks.values()))
+
+    return run
+
+
+def one_shot_filter(taskq):
+    """a queue loaded from csv for a single ls, no index exists yet"""
+
+    def run():
+        taskq.postings.clear()
+        predicate = query.compile_filter(taskq, WHERE, WHEREOR, SEARCH)
+        ids = query.candidate_ids(taskq, WHERE, WHEREOR)
+        return sum(1 for _ in filter(predicate, query.iter_tasks(taskq, ids=ids)))
+
+    return run
+
+
+def indexed_filter(taskq):
+    taskq.build_indexes()
+
+    def run():
+        predicate = query.compile_filter(taskq, WHERE, WHEREOR, SEARCH)
+        ids = query.candidate_ids(taskq, WHERE, WHEREOR)
+        return sum(1 for _ in filter(predicate, query.iter_tasks(taskq, ids=ids)))
+
+    return run
+
+
+if __name__ == "__main__":
+    taskq = build_queue(ROWS)
+    assert legacy_filter(taskq)() == compiled_filter(taskq)() == one_shot_filter(taskq)()
+    assert compiled_filter(taskq)() == indexed_filter(taskq)()
+
+    timed("matchi per row (before)", legacy_filter(taskq), ROWS)
+    timed("compiled predicate (after)", compiled_filter(taskq), ROWS)
+    timed("no postings yet, one-shot ls", one_shot_filter(taskq), ROWS)
+    timed("variant postings + predicate", indexed_filter(taskq), ROWS)
@@ -0,0 +1,20 @@
+import os
+import tempfile
+
+from base import build_queue, timed
+import consts
+import parsing
+
+ROWS = 100_000
+
+
+if __name__ == "__main__":
+    taskq = build_queue(ROWS)
+    taskq.config.set_value(consts.CONFIG_SNAPSHOT_CACHE, "True")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "taskqueue.csv")
+        parsing.serialize(path, taskq)
+
+        timed("csv deserialize", lambda: parsing.deserialize_csv(path), ROWS)
+        timed("snapshot load", lambda: parsing.load_snapshot(path), ROWS)
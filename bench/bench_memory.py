@@ -0,0 +1,21 @@
+import os
+import tempfile
+import tracemalloc
+
+from base import build_queue
+import parsing
+
+ROWS = 100_000
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "taskqueue.csv")
+        parsing.serialize(path, build_queue(ROWS))
+
+        tracemalloc.start()
+        taskq = parsing.deserialize_csv(path)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"{'csv deserialize resident':<40} {size / 2**20:9.2f} MiB total {size / ROWS:9.1f} B/row")
@@ -0,0 +1,61 @@
+from base import build_queue, timed
+import query
+
+ROWS = 100_000
+WHERE = [f"Id>{ROWS - 1000}"]
+
+
+def scanned_range(taskq):
+    def run():
+        predicate = query.compile_filter(taskq, WHERE)
+        return sum(1 for _ in filter(predicate, taskq.tasks.values()))
+
+    return run
+
+
+def cold_range(taskq):
+    """building the sorted index for a single query, what a one-shot ls would
+    pay if it used the index before one exists"""
+
+    def run():
+        taskq.sorted_indexes.clear()
+        taskq.sorted_index(taskq.header_pk())
+        predicate = query.compile_filter(taskq, WHERE)
+        ids = query.candidate_ids(taskq, WHERE)
+        return sum(1 for _ in filter(predicate, query.iter_tasks(taskq, ids=ids)))
+
+    return run
+
+
+def one_shot_range(taskq):
+    """a queue loaded for a single ls, no index exists so the predicate scans"""
+
+    def run():
+        taskq.sorted_indexes.clear()
+        predicate = query.compile_filter(taskq, WHERE)
+        ids = query.candidate_ids(taskq, WHERE)
+        return sum(1 for _ in filter(predicate, query.iter_tasks(taskq, ids=ids)))
+
+    return run
+
+
+def indexed_range(taskq):
+    taskq.sorted_index(taskq.header_pk())
+
+    def run():
+        predicate = query.compile_filter(taskq, WHERE)
+        ids = query.candidate_ids(taskq, WHERE)
+        return sum(1 for _ in filter(predicate, query.iter_tasks(taskq, ids=ids)))
+
+    return run
+
+
+if __name__ == "__main__":
+    taskq = build_queue(ROWS)
+    assert scanned_range(taskq)() == one_shot_range(taskq)() == cold_range(taskq)()
+    assert scanned_range(taskq)() == indexed_range(taskq)()
+
+    timed("range scan", scanned_range(taskq), ROWS)
+    timed("build sorted index + bisect (cold)", cold_range(taskq), ROWS)
+    timed("one-shot ls, no index yet", one_shot_range(taskq), ROWS)
+    timed("existing sorted index bisect", indexed_range(taskq), ROWS)
@@ -0,0 +1,134 @@
+import io
+import time
+import functools
+import contextlib
+
+from colorama import Fore
+from tabulate import tabulate
+
+from base import build_queue, timed
+import consts
+import util
+
+ROWS = 10_000
+WIDTH = 60
+
+
+def legacy_visual_length(line):
+    return len(functools.reduce(lambda acc, r: acc.replace(r, ""), Fore.__dict__.values(), line))
+
+
+def legacy_truncate(line, width):
+    idx = 0
+    visual_idx = 0
+    while visual_idx < width:
+        for r in Fore.__dict__.values():
+            if line[idx:].startswith(r):
+                idx += len(r)
+        visual_idx += 1
+        idx += 1
+    return line[:idx]
+
+
+def legacy_measure(lines):
+    def run():
+        for line in lines:
+            if WIDTH < legacy_visual_length(line):
+                legacy_truncate(line, WIDTH)
+
+    return run
+
+
+def measure(lines):
+    def run():
+        for line in lines:
+            if WIDTH < len(line) and WIDTH < util.find_visual_length_of_line(line):
+                util.truncate_visual(line, WIDTH)
+
+    return run
+
+
+LEGACY_BORDERS = ["─", "┴", "┼", "┬", "├", "│", "┤", "|", "┘", "┐", "┌", "└"]
+
+
+def legacy_render(table, headers, widths):
+    headers = [util.clr_surround_fore(h, Fore.GREEN) for h in headers]
+    text = tabulate(table, headers=headers, tablefmt="simple_grid", maxcolwidths=widths)
+
+    output = []
+    for idx, line in enumerate(text.split("\n")):
+        if idx % 2 == 0:
+            output.append(util.clr_surround_fore(line, Fore.BLACK))
+        else:
+            for r in LEGACY_BORDERS:
+                line = line.replace(r, util.clr_surround_fore(r, Fore.BLACK))
+            output.append(line)
+
+    lines = [util.truncate_visual(line, WIDTH) if WIDTH < util.find_visual_length_of_line(line) else line for line in output]
+    print("\n".join(lines) + Fore.RESET)
+
+
+class FirstWrite(io.StringIO):
+    def write(self, text):
+        if not hasattr(self, "first"):
+            self.first = time.perf_counter()
+        return super().write(text)
+
+
+def first_line_latency(func):
+    output = FirstWrite()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        func()
+    return output.first - start
+
+
+def render(taskq):
+    headers = taskq.get_display_headers()
+    table = [task.to_display_row(headers) for task in taskq.tasks.values()]
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            util.pretty_print_table(table, headers, [w or None for w in taskq.get_column_widths()])
+        return output.getvalue()
+
+    return run
+
+
+if __name__ == "__main__":
+    consts.FALLBACK_TERMINAL_SIZE = (WIDTH, 1000)
+    taskq = build_queue(ROWS)
+
+    rendered = render(taskq)()
+    lines = rendered.split("\n")
+    assert all(
+        legacy_truncate(line, WIDTH) == util.truncate_visual(line, WIDTH)
+        for line in lines[:200]
+        if WIDTH < util.find_visual_length_of_line(line)
+    )
+
+    timed("measure + truncate lines (before)", legacy_measure(lines), ROWS)
+    timed("measure + truncate lines (after)", measure(lines), ROWS)
+
+    headers = taskq.get_display_headers()
+    table = [task.to_display_row(headers) for task in taskq.tasks.values()]
+    widths = [w or None for w in taskq.get_column_widths()]
+
+    def tabulated():
+        legacy_render(table, headers, widths)
+
+    def native():
+        util.pretty_print_table(table, headers, widths)
+
+    def quietly(func):
+        def run():
+            with contextlib.redirect_stdout(io.StringIO()):
+                func()
+
+        return run
+
+    timed("render table (tabulate)", quietly(tabulated), ROWS, repeat=1)
+    timed("render table (native)", quietly(native), ROWS, repeat=1)
+
+    print(f"first line after (tabulate) {first_line_latency(tabulated) * 1000:9.2f} ms")
+    print(f"first line after (native)   {first_line_latency(native) * 1000:9.2f} ms")
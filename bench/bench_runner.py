@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+REPEAT = 50
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the launcher before it exec'd python: argv joined into one string and run
+# through /bin/sh with system()
+LEGACY_RUNNER = r"""
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+
+int main(int argc, char** argv) {
+	char exe[4096];
+	ssize_t len = readlink("/proc/self/exe", exe, sizeof(exe) - 1);
+	exe[len] = '\0';
+	*strrchr(exe, '/') = '\0';
+
+	char* command = malloc(3 * strlen(exe) + 64);
+	sprintf(command, "%s/venv/bin/python3 %s/src/main.py", exe, exe);
+
+	for (int i = 1; i < argc; i++) {
+		int quoted = strchr(argv[i], ' ') != NULL;
+		command = realloc(command, strlen(command) + strlen(argv[i]) + 4);
+		strcat(command, quoted ? " \"" : " ");
+		strcat(command, argv[i]);
+		if (quoted) {
+			strcat(command, "\"");
+		}
+	}
+
+	system(command);
+}
+"""
+
+
+def compile_runner(source: str, output: str):
+    subprocess.run(["gcc", "-O2", "-x", "c", "-", "-o", output], input=source.encode(), check=True)
+
+
+def median_time(argv: list[str]) -> float:
+    env = {**os.environ, "TQB_NO_DAEMON": "1"}
+    subprocess.run(argv, capture_output=True, env=env)
+
+    times = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        subprocess.run(argv, capture_output=True, env=env)
+        times.append(time.perf_counter() - start)
+
+    return sorted(times)[REPEAT // 2]
+
+
+def launch_times(src: str):
+    """median launch times with src as the src directory next to the runners"""
+    with tempfile.TemporaryDirectory() as tmp:
+        # the layout make release builds, python from the running environment
+        os.symlink(sys.prefix, os.path.join(tmp, "venv"))
+        os.symlink(src, os.path.join(tmp, "src"))
+
+        legacy, runner = os.path.join(tmp, "legacy"), os.path.join(tmp, "tqb")
+        compile_runner(LEGACY_RUNNER, legacy)
+        with open(os.path.join(ROOT, "runner.c"), "r") as fp:
+            compile_runner(fp.read(), runner)
+
+        python = os.path.join(tmp, "venv", "bin", "python3")
+        main = os.path.join(tmp, "src", "main.py")
+
+        for label, argv in (
+            ("python main.py", [python, main, "--version"]),
+            ("system() runner", [legacy, "--version"]),
+            ("execv runner", [runner, "--version"]),
+        ):
+            print(f"{label:<40} {median_time(argv) * 1000:9.2f} ms")
+
+
+if __name__ == "__main__":
+    print("tqb --version")
+    launch_times(os.path.join(ROOT, "src"))
+
+    # an empty main.py leaves only the cost of the launcher and interpreter
+    with tempfile.TemporaryDirectory() as src:
+        open(os.path.join(src, "main.py"), "w").close()
+        print("empty main.py")
+        launch_times(src)
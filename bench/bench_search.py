@@ -0,0 +1,33 @@
+from base import build_queue, timed
+import query
+
+ROWS = 100_000
+SEARCH = "task 4242"
+
+
+def scanned_search(taskq):
+    def run():
+        predicate = query.compile_filter(taskq, search=SEARCH)
+        return sum(1 for _ in filter(predicate, taskq.tasks.values()))
+
+    return run
+
+
+def indexed_search(taskq):
+    taskq.word_index()
+
+    def run():
+        predicate = query.compile_filter(taskq, search=SEARCH)
+        ids = query.candidate_ids(taskq, search=SEARCH)
+        return sum(1 for _ in filter(predicate, query.iter_tasks(taskq, ids=ids)))
+
+    return run
+
+
+if __name__ == "__main__":
+    taskq = build_queue(ROWS)
+    assert scanned_search(taskq)() == indexed_search(taskq)()
+
+    timed("substring scan", scanned_search(taskq), ROWS)
+    timed("search index + predicate", indexed_search(taskq), ROWS)
+    timed("search index build", lambda: setattr(taskq, "search_index", None) or taskq.word_index(), ROWS, repeat=1)
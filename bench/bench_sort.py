@@ -0,0 +1,29 @@
+from base import build_queue, timed
+import query
+
+ROWS = 100_000
+SORTS = ("Priority", "Priority,Sprint:desc,Id")
+LIMIT = 20
+
+
+def legacy_sort(taskq):
+    def run():
+        return sorted(taskq.tasks.values(), key=lambda x: x.geti("Priority"), reverse=True)[:LIMIT]
+
+    return run
+
+
+def compiled_sort(taskq, spec):
+    def run():
+        key = query.compile_sort_key(taskq, spec)
+        return query.take(taskq.tasks.values(), limit=LIMIT, key=key)[0]
+
+    return run
+
+
+if __name__ == "__main__":
+    taskq = build_queue(ROWS)
+
+    timed("geti key, full sort (before)", legacy_sort(taskq), ROWS)
+    for spec in SORTS:
+        timed(f"{spec}, top-k heap (after)", compiled_sort(taskq, spec), ROWS)
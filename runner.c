@@ -1,122 +1,226 @@
+/* struct ucred for SO_PEERCRED */
+#define _GNU_SOURCE
+
+#include <errno.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
 #include <unistd.h>
+#include <limits.h>
 #include <sys/param.h>
+#include <sys/ioctl.h>
+#include <sys/socket.h>
+#include <sys/un.h>
 
 #define ENDPOINT "venv/bin/python3"
 #define FILEPATH "src/main.py"
-#define DEFAULT_BUF 0x100
 
+/*
+ * -s skips the user site directory, which tqb never needs. -S and -I start
+ * faster still but drop the venv site-packages and the src directory from
+ * sys.path, which tqb imports from
+ */
+#define PYTHON_FLAGS "-s"
 
-char* trim_ws(char* src) {
-	int length = strlen(src);
-	char* swp = malloc(length);
+/* must match DAEMON_* in src/consts.py */
+#define DAEMON_PROTOCOL "tqb1"
+#define DAEMON_SOCKET_NAME "tqb.sock"
+#define DAEMON_SOCKET_ENV "TQB_SOCKET"
+#define DAEMON_DISABLE_ENV "TQB_NO_DAEMON"
 
-	int idx = 0;
-	int trail = 0;
 
-	for (int i = 0; i < length; i++) {
-		if (src[i] == ' ') {
-			if (trail == 1) {
-				swp[idx] = src[i];
-				idx++;
-			}
-		}
+int socket_path(char* buf, size_t size) {
+	const char* path = getenv(DAEMON_SOCKET_ENV);
+	if (path != NULL && *path) {
+		return snprintf(buf, size, "%s", path);
+	}
 
-		else {
-			trail = 1;
-			swp[idx] = src[i];
-			idx++;
-		}
+	const char* runtime = getenv("XDG_RUNTIME_DIR");
+	if (runtime != NULL && *runtime) {
+		return snprintf(buf, size, "%s/%s", runtime, DAEMON_SOCKET_NAME);
 	}
 
-	char* src_rev = malloc(idx);
-	strcpy(src_rev, swp);
+	return snprintf(buf, size, "/tmp/tqb-%d/%s", (int)getuid(), DAEMON_SOCKET_NAME);
+}
 
-	trail = 0;
-	int idx_where;
 
-	for (int i = idx-1; i > -1; i--) {
-		if (src_rev[i] != ' ') {
-			idx_where = i;
-			break;
+/* whether the process at the other end of fd runs as this user */
+int peer_is_self(int fd) {
+#ifdef SO_PEERCRED
+	struct ucred cred;
+	socklen_t len = sizeof(cred);
+	if (getsockopt(fd, SOL_SOCKET, SO_PEERCRED, &cred, &len) < 0) {
+		return 0;
+	}
+	return cred.uid == getuid();
+#else
+	uid_t uid;
+	gid_t gid;
+	if (getpeereid(fd, &uid, &gid) < 0) {
+		return 0;
+	}
+	return uid == getuid();
+#endif
+}
+
+
+int write_all(int fd, const char* buf, size_t len) {
+	while (len > 0) {
+		ssize_t written = write(fd, buf, len);
+		if (written < 0) {
+			return -1;
 		}
+		buf += written;
+		len -= written;
 	}
+	return 0;
+}
 
-	char* ptr = malloc(idx_where+1);
-	ptr = strndup(swp, idx_where+2);
-	free(src_rev);
-	free(swp);
 
-	return ptr;
+int send_field(int fd, const char* field) {
+	return write_all(fd, field, strlen(field) + 1);
 }
 
 
-char* dir(const char* path) {
-	char* last_slash = strrchr(path, '/');
-	if (last_slash == NULL) {
-		return ".";
+/*
+ * run the command on a running tqb daemon, see src/daemon.py for the protocol
+ * returns the exit status, or -1 when the command has to run in a new process
+ */
+int forward_to_daemon(int argc, char** argv) {
+	const char* disable = getenv(DAEMON_DISABLE_ENV);
+	if (disable != NULL && *disable) {
+		return -1;
 	}
-	char* ptr = strndup(path, (size_t)last_slash - (size_t)path);
-	return ptr;
-}
 
+	struct sockaddr_un addr = {0};
+	addr.sun_family = AF_UNIX;
+	int pathlen = socket_path(addr.sun_path, sizeof(addr.sun_path));
+	if (pathlen < 0 || pathlen >= (int)sizeof(addr.sun_path)) {
+		return -1;
+	}
 
-int main(int argc, char** argv) {
-	char* exebuf = malloc(DEFAULT_BUF);
-	char* exedir = malloc(DEFAULT_BUF);
-	char* python3buf = malloc(DEFAULT_BUF);
+	int fd = socket(AF_UNIX, SOCK_STREAM, 0);
+	if (fd < 0) {
+		return -1;
+	}
 
-	int pathlen = MIN(readlink("/proc/self/exe", exebuf, DEFAULT_BUF), DEFAULT_BUF - 1);
-	if (pathlen >= 0) {
-		exebuf[pathlen] = '\0';
+	if (connect(fd, (struct sockaddr*)&addr, sizeof(addr)) < 0) {
+		close(fd);
+		return -1;
 	}
 
-	strcpy(exedir, exebuf);
-	char* ptr = dir(trim_ws(exebuf));
-	strcpy(exedir, ptr);
+	if (!peer_is_self(fd)) {
+		fprintf(stderr, "tqb: ignoring daemon socket %s owned by another user\n", addr.sun_path);
+		close(fd);
+		return -1;
+	}
 
-	exedir = realloc(exedir, strlen(exedir));
+	char cwd[PATH_MAX];
+	char terminal[32] = "";
+	struct winsize ws;
 
-	strcpy(python3buf, exedir);
+	if (isatty(STDOUT_FILENO) && ioctl(STDOUT_FILENO, TIOCGWINSZ, &ws) == 0) {
+		snprintf(terminal, sizeof(terminal), "%dx%d", ws.ws_col, ws.ws_row);
+	}
 
-	size_t p3bufsize = strlen(python3buf) + strlen(ENDPOINT) + strlen(exedir) + strlen(FILEPATH) + 3;
-	python3buf = realloc(python3buf, p3bufsize);
-	strcat(python3buf, "/");
-	strcat(python3buf, ENDPOINT);
-	strcat(python3buf, " ");
-	strcat(python3buf, exedir);
-	strcat(python3buf, "/");
-	strcat(python3buf, FILEPATH);
+	int failed = getcwd(cwd, sizeof(cwd)) == NULL
+		|| send_field(fd, DAEMON_PROTOCOL)
+		|| send_field(fd, cwd)
+		|| send_field(fd, terminal);
 
-	char* command = malloc(p3bufsize);
-	strcpy(command, python3buf);
+	for (int i = 1; i < argc && !failed; i++) {
+		failed = send_field(fd, argv[i]);
+	}
 
-	for (int i=1; i<argc; i++) {
-		char* arg = argv[i];
-		size_t arg_size = strlen(arg);
+	if (failed) {
+		close(fd);
+		return -1;
+	}
+	shutdown(fd, SHUT_WR);
 
-		int quoted_arg = 0;
-		if (strchr(arg, ' ') != NULL) {
-			arg_size += 2;
-			quoted_arg = 1;
+	/* "<status> <stdout length>\n", then stdout and stderr */
+	char header[64];
+	size_t hlen = 0;
+	while (hlen < sizeof(header) - 1 && read(fd, header + hlen, 1) == 1) {
+		if (header[hlen++] == '\n') {
+			break;
 		}
+	}
+	header[hlen] = '\0';
+
+	int status;
+	size_t out_len;
+	if (hlen == 0 || header[hlen - 1] != '\n' || sscanf(header, "%d %zu", &status, &out_len) != 2) {
+		fprintf(stderr, "tqb: daemon closed the connection\n");
+		close(fd);
+		return 1;
+	}
 
-		int new_len = strlen(command) + 1 + arg_size;
+	if (status < 0) {
+		close(fd);
+		return -1;
+	}
 
-		command = realloc(command, new_len);
-		strcat(command, " ");
-		if (quoted_arg) {
-			strcat(command, "\"");
-		}
+	char buf[BUFSIZ];
+	ssize_t n;
+	while ((n = read(fd, buf, sizeof(buf))) > 0) {
+		size_t to_out = MIN((size_t)n, out_len);
+		write_all(STDOUT_FILENO, buf, to_out);
+		write_all(STDERR_FILENO, buf + to_out, n - to_out);
+		out_len -= to_out;
+	}
 
-		strcat(command, arg);
+	close(fd);
+	return status;
+}
 
-		if (quoted_arg) {
-			strcat(command, "\"");
-		}
+
+int main(int argc, char** argv) {
+	int status = forward_to_daemon(argc, argv);
+	if (status >= 0) {
+		return status;
+	}
+
+	char exedir[PATH_MAX];
+	ssize_t pathlen = readlink("/proc/self/exe", exedir, sizeof(exedir) - 1);
+	if (pathlen < 0) {
+		perror("tqb: could not locate the tqb executable");
+		return 1;
 	}
+	exedir[pathlen] = '\0';
+
+	char* last_slash = strrchr(exedir, '/');
+	if (last_slash != NULL) {
+		*last_slash = '\0';
+	}
+
+	char python3[PATH_MAX];
+	char script[PATH_MAX];
+	if (snprintf(python3, sizeof(python3), "%s/%s", exedir, ENDPOINT) >= (int)sizeof(python3)
+		|| snprintf(script, sizeof(script), "%s/%s", exedir, FILEPATH) >= (int)sizeof(script)) {
+		fprintf(stderr, "tqb: install path too long\n");
+		return 1;
+	}
+
+	/* the arguments are handed to python as they are, no shell re-parses them */
+	char* flags[] = {PYTHON_FLAGS};
+	size_t nflags = sizeof(flags) / sizeof(flags[0]);
+
+	char** args = malloc((nflags + argc + 2) * sizeof(char*));
+	size_t n = 0;
+
+	args[n++] = python3;
+	for (size_t i = 0; i < nflags; i++) {
+		args[n++] = flags[i];
+	}
+	args[n++] = script;
+	for (int i = 1; i < argc; i++) {
+		args[n++] = argv[i];
+	}
+	args[n] = NULL;
+
+	execv(python3, args);
 
-	system(command);
+	fprintf(stderr, "tqb: could not run %s: %s\n", python3, strerror(errno));
+	return 127;
 }
@@ -1,2 +1,2 @@
 #!/bin/sh
-/opt/tqb/venv/bin/python3 /opt/tqb/src/main.py "$@"
+exec /opt/tqb/venv/bin/python3 -s /opt/tqb/src/main.py "$@"
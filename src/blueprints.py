@@ -47,7 +47,7 @@ def default() -> TaskQueue:
 
     constraints = {c.HeaderName: c for c in constraint_list}
     return TaskQueue(
-        constraints=constraints, headers=headers, tasks=[], config=Config.empty()
+        constraints=constraints, headers=headers, tasks={}, config=Config.empty()
     )
 
 
@@ -85,7 +85,7 @@ def todo() -> TaskQueue:
 
     constraints = {c.HeaderName: c for c in constraint_list}
     return TaskQueue(
-        constraints=constraints, headers=headers, tasks=[], config=Config.empty()
+        constraints=constraints, headers=headers, tasks={}, config=Config.empty()
     )
 
 
@@ -139,7 +139,7 @@ def dev() -> TaskQueue:
 
     constraints = {c.HeaderName: c for c in constraint_list}
     return TaskQueue(
-        constraints=constraints, headers=headers, tasks=[], config=Config.empty()
+        constraints=constraints, headers=headers, tasks={}, config=Config.empty()
     )
 
 
@@ -220,7 +220,7 @@ def sprint() -> TaskQueue:
 
     constraints = {c.HeaderName: c for c in constraint_list}
     return TaskQueue(
-        constraints=constraints, headers=headers, tasks=[], config=Config.empty()
+        constraints=constraints, headers=headers, tasks={}, config=Config.empty()
     )
 
 
@@ -252,7 +252,7 @@ def projects() -> TaskQueue:
 
     constraints = {c.HeaderName: c for c in constraint_list}
     return TaskQueue(
-        constraints=constraints, headers=headers, tasks=[], config=Config.empty()
+        constraints=constraints, headers=headers, tasks={}, config=Config.empty()
     )
 
 
@@ -1,48 +1,146 @@
 import os
+import sys
 import csv
 import random
+import contextlib
 import globals
-import fnmatch
-import itertools
-import shlex
 import program
 
-from typing import Callable, Iterable
+from typing import Callable, Iterable, Iterator, Optional
 from argparse import Namespace, ArgumentParser
 
 import consts
 import parsing
+import journal
+import storage
 import colours
 import util
-import logo
+import query
 from tasks import Task, TaskQueue
 from constraints import Constraint
 from config import Config, ConfigPair
-import blueprints
 
-import pyperclip
 from colorama import Fore
 
+# blueprints, logo, pyperclip and shlex are imported by the commands that
+# use them, most invocations never need them and tqb has to start quickly
+
+
+class DeferredSaves:
+    """queues changed by the commands of tqb batch, saved together by flush
+    instead of after every command"""
+
+    def __init__(self):
+        self.pending: dict[str, tuple[str, TaskQueue, Optional[str]]] = {}
+
+    def defer(self, args: Namespace, taskq: TaskQueue):
+        self.pending[os.path.abspath(args.path)] = args.path, taskq, args.backend
+
+    def flush(self):
+        for path, taskq, backend in self.pending.values():
+            # create and import replace the queue at path, changes to the old one are lost
+            replaced = storage.resident is not None and storage.resident.get(path) is not taskq
+            if taskq.is_dirty() and not replaced:
+                storage.serialize(path, taskq, backend)
+
+        self.pending.clear()
+
+
+# set while tqb batch or an alias runs, tqb_serialize then leaves saving to them
+deferred_saves: Optional[DeferredSaves] = None
+
+
+@contextlib.contextmanager
+def deferring_saves() -> Iterator[DeferredSaves]:
+    """load every queue once for the commands run in the block and save the
+    changed ones when it ends, an error drops the changes not flushed yet,
+    nested blocks join the outer one"""
+    global deferred_saves
+    if deferred_saves is not None:
+        yield deferred_saves
+        return
+
+    resident = storage.resident
+    if resident is None:
+        storage.resident = storage.ResidentQueues()
+
+    deferred_saves = DeferredSaves()
+    try:
+        yield deferred_saves
+        deferred_saves.flush()
+    except BaseException:
+        storage.resident.clear()
+        raise
+    finally:
+        deferred_saves = None
+        storage.resident = resident
+
+
+def queue_options(args: Namespace) -> list[str]:
+    """the global options of args to pass on to the commands it runs"""
+    options = ["--path", args.path]
+    if args.backend:
+        options += ["--backend", args.backend]
+    if args.quiet:
+        options.append("-q")
+
+    return options
+
+
+def load_queue(args: Namespace, header_only: bool = False, **kwargs) -> TaskQueue:
+    try:
+        if header_only:
+            taskq = storage.deserialize_header(args.path, args.backend)
+        else:
+            taskq = storage.deserialize(args.path, args.backend, **kwargs)
+    except FileNotFoundError:
+        raise AssertionError(f"taskqueue not found at path '{args.path}'")
+
+    globals.QUIET_OPTION_SET = bool(
+        taskq.config.get_value("GlobalQuiet", globals.QUIET_OPTION_SET)
+    )
+
+    return taskq
+
 
 def tqb_serialize(func: Callable[TaskQueue, Namespace]):
     def inner(args: Namespace):
-        try:
-            taskq = parsing.deserialize(args.path)
-        except FileNotFoundError:
-            raise AssertionError(f"taskqueue not found at path '{args.path}'")
+        taskq = load_queue(args)
+        func(taskq, args)
+
+        if taskq.is_dirty() and deferred_saves is not None:
+            deferred_saves.defer(args, taskq)
+        elif taskq.is_dirty():
+            storage.serialize(args.path, taskq, args.backend)
+
+    return inner
 
-        globals.QUIET_OPTION_SET = bool(
-            taskq.config.get_value("GlobalQuiet", globals.QUIET_OPTION_SET)
-        )
 
+def tqb_query(func: Callable[TaskQueue, Namespace]):
+    """like tqb_serialize for read-only commands, the storage backend may skip
+    loading tasks that cannot match the --where and --whereor clauses"""
+
+    def inner(args: Namespace):
+        taskq = load_queue(args, where=args.where, whereor=args.whereor)
+        func(taskq, args)
+
+    return inner
+
+
+def tqb_header(func: Callable[TaskQueue, Namespace]):
+    """for read-only commands that only need the config and constraint sections,
+    the task rows are never read"""
+
+    def inner(args: Namespace):
+        taskq = load_queue(args, header_only=True)
         func(taskq, args)
-        parsing.serialize(args.path, taskq)
 
     return inner
 
 
 def create(parser: ArgumentParser, root: ArgumentParser):
     """create a new task queue with default options"""
+    import blueprints
 
     def inner(args: Namespace):
         headers = args.headers.copy()
@@ -73,7 +171,7 @@ def create(parser: ArgumentParser, root: ArgumentParser):
                 f"creating taskqueue at {args.path} with headers ({header_str})"
             )
 
-        parsing.serialize(args.path, tq)
+        storage.compact(args.path, tq, args.backend)
 
         if not globals.QUIET_OPTION_SET:
             print(util.clr_surround_fore(msg_before, colours.Fore.CYAN))
@@ -95,6 +193,8 @@ def help(parser: ArgumentParser, root: ArgumentParser):
     """print the program help text"""
 
     def print_help():
+        import logo
+
         txt = logo.LOGO
 
         colours = [
@@ -133,10 +233,17 @@ def help(parser: ArgumentParser, root: ArgumentParser):
             "unarchive multiple tasks": "tqb archive 1 2 --unarchive",
             "update task priority": "tqb update 1 Priority High",
             "list tasks sorted by priority": "tqb ls --sort Priority",
+            "list tasks by status, then newest first": "tqb ls --sort Status,Id:desc",
             "list tasks including archived": "tqb ls --all",
             "list tasks in progress": "tqb ls --where Status='In Progress'",
             "list completed tasks including archived": "tqb ls --where status=d --all",
             "search entire taskqueue for tasks mentioning 'BUG'": "tqb ls --search BUG",
+            "list tasks with ids above 100": "tqb ls --where 'Id>100'",
+            "list tasks in an id range": "tqb ls --where Id=100..200",
+            "list tasks that are not done": "tqb ls --where 'status!=done'",
+            "create a taskqueue stored in an sqlite database": "tqb --path tasks.db create",
+            "convert the taskqueue to sqlite": "tqb export tasks.db",
+            "load a taskqueue from a csv file": "tqb --path tasks.db import taskqueue.csv --force",
         }
 
         EXAMPLES_QUICKSTART = {
@@ -161,8 +268,12 @@ def help(parser: ArgumentParser, root: ArgumentParser):
             "listing current config options": "tqb config ls",
             "setting the -q option for all commands": "tqb config add GlobalQuiet True",
             "removing the GlobalQuiet config option": "tqb config remove GlobalQuiet False",
+            "cache the parsed taskqueue in a binary sidecar file": "tqb config add SnapshotCache True",
+            "compact the journal once it grows past 64KiB": "tqb config add JournalMaxSize 65536",
+            "always rewrite the taskqueue file instead of journaling": "tqb config add JournalMaxSize 0",
             "adding an alias for listing backlog tasks": "tqb config add Alias lsbak 'ls --all --where Status=Backlog'",
             "using the alias": "tqb alias lsbak",
+            "adding an alias that runs several commands, $0 is its first argument": "tqb config add Alias start 'mark $0 i; show $0'",
             "removing the alias": "tqb config remove Alias lsbak",
         }
 
@@ -206,7 +317,7 @@ def help(parser: ArgumentParser, root: ArgumentParser):
 def ls(parser: ArgumentParser, root: ArgumentParser):
     """display the task queue"""
 
-    @tqb_serialize
+    @tqb_query
     def inner(taskq: TaskQueue, args: Namespace):
         headers = (
             taskq.headers
@@ -227,70 +338,55 @@ def ls(parser: ArgumentParser, root: ArgumentParser):
             twidth, theight = util.get_terminal_size()
 
             TRUNCATE_LENGTH = max((theight // 2) - 3, 2) or consts.LS_TRUNCATE_LENGTH
+            truncate = not args.all and not args.notruncate
 
-            table: list[list] = []
-            tasks_list = taskq.tasks
-            ids_list = []
-
+            sort_key = None
             if args.sort is not None:
-                assert taskq.smart_header_match(
-                    args.sort
-                ), f"sorting column {args.sort} is not a valid header"
-                tasks_list = sorted(
-                    tasks_list, key=lambda x: x.geti(args.sort), reverse=True
-                )
+                sort_key = query.compile_sort_key(taskq, args.sort, reverse=args.oldest)
+            elif args.search is not None:
+                sort_key = query.compile_search_rank(taskq, args.search, oldest=args.oldest)
+
+            if args.all:
+                taskq.load_archive()
+
+            candidates = query.candidate_ids(taskq, args.where, args.whereor, args.search)
+            tasks = query.iter_tasks(taskq, oldest=args.oldest, ids=candidates)
+            if not args.all:
+                tasks = query.drop_archived(tasks)
+
+            tasks = query.apply_predicate(
+                tasks, query.compile_filter(taskq, args.where, args.whereor, args.search)
+            )
 
-            if not args.oldest:
-                tasks_list = reversed(tasks_list)
-
-            num_truncated_tasks = 0
-            for idx, task in enumerate(tasks_list):
-                if not args.all and task.is_archived():
-                    continue
-
-                if (
-                    len(table) >= TRUNCATE_LENGTH
-                    and not args.all
-                    and not args.notruncate
-                ):
-                    globals.LS_OUTPUT_TRUNCATED = True
-                    num_truncated_tasks += 1
-                    continue
-
-                if args.whereor:
-                    parititioned = [clause.partition("=") for clause in args.whereor]
-                    if not any(task.matchi(c, v) for c, _, v in parititioned):
-                        continue
-
-                if args.where:
-                    parititioned = [clause.partition("=") for clause in args.where]
-                    if not all(task.matchi(c, v) for c, _, v in parititioned):
-                        continue
-
-                if args.search is not None:
-                    pat = f"*{args.search.lower()}*"
-                    if not any(
-                        fnmatch.fnmatch(str(value).lower(), pat)
-                        for value in task.items.values()
-                    ):
-                        continue
-
-                table.append(task.to_display_row(headers))
-                ids_list.append(str(task.id))
+            page, truncated, total = query.take(
+                tasks,
+                limit=TRUNCATE_LENGTH if truncate else None,
+                key=sort_key,
+                count=args.count,
+            )
+            globals.LS_OUTPUT_TRUNCATED = truncated
+
+            table = [task.to_display_row(headers) for task in page]
+            ids_list = [str(task.id) for task in page]
 
             if args.copyids:
+                import pyperclip
+
                 pyperclip.copy(" ".join(ids_list))
 
             if not args.ids:
                 col_widths = taskq.get_column_widths()
 
-                message_after = (
-                    [
-                        f"output truncated to {TRUNCATE_LENGTH} of {TRUNCATE_LENGTH + num_truncated_tasks} entries"
+                if truncated and total is not None:
+                    message_after = [f"output truncated to {len(table)} of {total} entries"]
+                elif truncated:
+                    message_after = [
+                        f"output truncated to {len(table)} entries (use --count for the total)"
                     ]
-                    if globals.LS_OUTPUT_TRUNCATED
-                    else [f"{len(table)} tasks"] if table else ["no tasks in queue ^^"]
-                )
+                else:
+                    message_after = (
+                        [f"{len(table)} tasks"] if table else ["no tasks in queue ^^"]
+                    )
 
                 util.pretty_print_table(
                     table if table else [[]],
@@ -311,7 +407,11 @@ def ls(parser: ArgumentParser, root: ArgumentParser):
         "-a", "--all", action="store_true", help="display archived tasks"
     )
 
-    parser.add_argument("--sort", default=None, help="sort by column")
+    parser.add_argument(
+        "--sort",
+        default=None,
+        help="sort by comma separated columns, each optionally suffixed with :asc or :desc",
+    )
 
     parser.add_argument(
         "-nt", "--notruncate", action="store_true", help="do not truncate output"
@@ -325,13 +425,13 @@ def ls(parser: ArgumentParser, root: ArgumentParser):
         "-w",
         "--where",
         nargs="+",
-        help="column=value filter clause (all must pass)",
+        help="column=value filter clause (all must pass), != negates and typed columns also take <, <=, >, >= and lo..hi",
     )
 
     parser.add_argument(
         "--search",
         default=None,
-        help="search for value in across all columns",
+        help="search the text columns for value, best matches first",
     )
 
     parser.add_argument(
@@ -340,6 +440,12 @@ def ls(parser: ArgumentParser, root: ArgumentParser):
         help="show all columns, including hidden ones",
     )
 
+    parser.add_argument(
+        "--count",
+        action="store_true",
+        help="count every matching task, even when output is truncated",
+    )
+
     parser.add_argument("--ids", action="store_true", help="only output task ids")
     parser.add_argument(
         "--copyids", action="store_true", help="copy ids of tasks to clipboard"
@@ -535,40 +641,147 @@ def archive(parser: ArgumentParser, root: ArgumentParser):
     return inner
 
 
-def alias(parser: ArgumentParser, root: ArgumentParser):
-    """use an alias defined with config"""
+def compact(parser: ArgumentParser, root: ArgumentParser):
+    """merge the journal of pending changes back into the task queue file"""
 
     @tqb_serialize
     def inner(taskq: TaskQueue, args: Namespace):
-        alias = next(
-            (
-                a
-                for a in taskq.config.get_all(consts.CONFIG_ALIAS_NAMESPACE)
-                if a.Value == args.name
-            ),
-            None,
-        )
-        assert alias, f"could not find alias with name '{args.name}'"
-        assert alias.Opt, "could not run alias, is empty"
-
-        cmd_txt = alias.Opt
-        for idx, arg in enumerate(args.arguments):
-            replace_str = f"${idx}"
-            if arg.startswith("-"):
-                cmd_txt += f" {arg} "
-            elif replace_str in cmd_txt:
-                cmd_txt = cmd_txt.replace(replace_str, arg)
-            else:
-                cmd_txt += f" {arg} "
+        taskq.touch()
+
+        if not globals.QUIET_OPTION_SET:
+            print(
+                util.star_symbol_surround(
+                    "task queue compacted", consts.STAR_MSG_OUTPUT_WIDTH
+                )
+            )
+
+    return inner
 
-        run_args = shlex.split(cmd_txt)
-        parsed = root.parse_args(run_args)
-        if hasattr(parsed, "func"):
-            assert (
-                parsed.func.__name__ != "alias"
-            ), "do NOT recursively run alias commands lol"
 
-        program.runner(root, run_args)
+def export(parser: ArgumentParser, root: ArgumentParser):
+    """write a copy of the task queue to another file, converting storage backends"""
+
+    @tqb_serialize
+    def inner(taskq: TaskQueue, args: Namespace):
+        assert args.force or not os.path.exists(
+            args.destination
+        ), "file already exists at destination, use --force to overwrite it"
+
+        taskq.load_archive()
+        storage.compact(args.destination, taskq, args.to)
+
+        if not globals.QUIET_OPTION_SET:
+            print(
+                util.star_symbol_surround(
+                    f"exported task queue to {args.destination}",
+                    consts.STAR_MSG_OUTPUT_WIDTH,
+                )
+            )
+
+    parser.add_argument("destination", help="path to write the task queue to")
+    parser.add_argument(
+        "--to",
+        default=None,
+        choices=storage.BACKENDS,
+        help="storage backend of the destination (default: from file extension)",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="overwrite the destination if it exists"
+    )
+
+    return inner
+
+
+def import_(parser: ArgumentParser, root: ArgumentParser):
+    """replace the task queue with the contents of another file, converting storage backends"""
+
+    def inner(args: Namespace):
+        assert args.force or not os.path.exists(
+            args.path
+        ), "file already exists at specified path, use --force to overwrite it"
+
+        try:
+            taskq = storage.deserialize(args.source, args.source_backend)
+        except FileNotFoundError:
+            raise AssertionError(f"taskqueue not found at path '{args.source}'")
+
+        taskq.load_archive()
+        storage.compact(args.path, taskq, args.backend)
+
+        if not globals.QUIET_OPTION_SET:
+            print(
+                util.star_symbol_surround(
+                    f"imported task queue from {args.source}",
+                    consts.STAR_MSG_OUTPUT_WIDTH,
+                )
+            )
+
+    parser.add_argument("source", help="path to read the task queue from")
+    parser.add_argument(
+        "--from",
+        dest="source_backend",
+        default=None,
+        choices=storage.BACKENDS,
+        help="storage backend of the source (default: from file extension)",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="overwrite the task queue if it exists"
+    )
+
+    return inner
+
+
+def expand_alias(command: str, arguments: list[str]) -> list[list[str]]:
+    """the arguments of every command an alias runs, commands are separated by
+    ; and $N is replaced with the Nth argument, other arguments are appended"""
+    import shlex
+
+    for idx, arg in enumerate(arguments):
+        replace_str = f"${idx}"
+        if arg.startswith("-"):
+            command += f" {arg} "
+        elif replace_str in command:
+            command = command.replace(replace_str, arg)
+        else:
+            command += f" {arg} "
+
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=";")
+    lexer.whitespace_split = True
+
+    commands = [[]]
+    for token in lexer:
+        if token.strip(";"):
+            commands[-1].append(token)
+        elif commands[-1]:
+            commands.append([])
+
+    return [argv for argv in commands if argv]
+
+
+def alias(parser: ArgumentParser, root: ArgumentParser):
+    """use an alias defined with config"""
+
+    def inner(args: Namespace):
+        options = queue_options(args)
+
+        # the queue is loaded here once, the aliased commands find it resident
+        # and leave their changes to a single save at the end
+        with deferring_saves():
+            taskq = load_queue(args)
+            alias = taskq.config.find(consts.CONFIG_ALIAS_NAMESPACE, args.name)
+            assert alias, f"could not find alias with name '{args.name}'"
+
+            commands = expand_alias(alias.Opt, args.arguments)
+            assert commands, "could not run alias, is empty"
+
+            for argv in commands:
+                parsed = root.parse_args(options + argv)
+                assert (
+                    getattr(parsed, "subcommand", None) != "alias"
+                ), "do NOT recursively run alias commands lol"
+
+            for argv in commands:
+                program.runner(root, options + argv)
 
     parser.add_argument("name", help="name of the alias to use")
     parser.add_argument(
@@ -588,13 +801,7 @@ def column(parser: ArgumentParser, root: ArgumentParser):
         def inner(taskq: TaskQueue, args: Namespace):
             target = args.target
 
-            assert target not in taskq.headers, f"column named {target} already exists"
-
-            taskq.headers.append(target)
-            for task in taskq.tasks:
-                task.items[target] = ""
-
-            taskq.constraints[target] = Constraint.empty(target)
+            taskq.add_column(target)
 
             if not globals.QUIET_OPTION_SET:
                 print(
@@ -613,11 +820,7 @@ def column(parser: ArgumentParser, root: ArgumentParser):
         def inner(taskq: TaskQueue, args: Namespace):
             target = args.target
 
-            assert target in taskq.headers, "column named {target} does not exist"
-
-            cidx = taskq.headers.index(target)
-            taskq.headers.pop(cidx)
-            taskq.headers.insert(args.index, target)
+            taskq.move_column(target, args.index)
 
             if not globals.QUIET_OPTION_SET:
                 print(
@@ -640,23 +843,7 @@ def column(parser: ArgumentParser, root: ArgumentParser):
         def inner(taskq: TaskQueue, args: Namespace):
             old_name = args.target
 
-            assert old_name in taskq.headers, "column named {target} does not exist"
-
-            cidx = taskq.headers.index(old_name)
-            taskq.headers[cidx] = args.name
-
-            for task in taskq.tasks:
-                col_value = task.items[old_name]
-                del task.items[old_name]
-                task.items[args.name] = col_value
-
-            constraint = taskq.find_constraint_fallback(old_name)
-            constraint.HeaderName = args.name
-
-            if taskq.find_constraint(old_name):
-                del taskq.constraints[old_name]
-
-            taskq.constraints[args.name] = constraint
+            taskq.rename_column(old_name, args.name)
 
             if not globals.QUIET_OPTION_SET:
                 print(
@@ -676,16 +863,7 @@ def column(parser: ArgumentParser, root: ArgumentParser):
         @tqb_serialize
         def inner(taskq: TaskQueue, args: Namespace):
             target = args.target
-            assert target in taskq.headers, "column named {target} does not exist"
-
-            cidx = taskq.headers.index(target)
-            taskq.headers.pop(cidx)
-
-            for task in taskq.tasks:
-                del task.items[target]
-
-            if taskq.find_constraint(target):
-                del taskq.constraints[target]
+            taskq.remove_column(target)
 
             if not globals.QUIET_OPTION_SET:
                 print(
@@ -706,13 +884,165 @@ def column(parser: ArgumentParser, root: ArgumentParser):
         parser.set_defaults(func=func)
 
 
+def batch_commands(lines: Iterable[str], format: str) -> Iterator[tuple[int, list[str]]]:
+    """yield the line number and arguments of every command in a batch, one per
+    line as shell words or as a JSON list of arguments (or {"argv": [...]})"""
+    import json
+    import shlex
+
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        if format == "jsonl" or (format == "auto" and line[0] in "[{"):
+            try:
+                argv = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise AssertionError(f"line {number}: invalid JSON ({e})")
+
+            if isinstance(argv, dict):
+                argv = argv.get("argv")
+
+            assert isinstance(argv, list) and all(
+                isinstance(arg, str) for arg in argv
+            ), f"line {number}: expected a list of arguments"
+        else:
+            try:
+                argv = shlex.split(line)
+            except ValueError as e:
+                raise AssertionError(f"line {number}: {e}")
+
+        if argv and argv[0] == consts.APP_NAME:
+            argv = argv[1:]
+
+        yield number, argv
+
+
+def batch(parser: ArgumentParser, root: ArgumentParser):
+    """run many commands with each task queue loaded once and saved once at the end"""
+    import io
+
+    def run(argv: list[str], report: bool) -> tuple[int, str, str]:
+        stdout, stderr = io.StringIO(), io.StringIO()
+        status = 0
+
+        with contextlib.ExitStack() as stack:
+            if report:
+                stack.enter_context(contextlib.redirect_stdout(stdout))
+                stack.enter_context(contextlib.redirect_stderr(stderr))
+
+            try:
+                program.runner(root, argv)
+            except AssertionError as e:
+                print(f"{consts.APP_NAME}: {e}", file=sys.stderr)
+                status = 1
+            except SystemExit as e:
+                if isinstance(e.code, str):
+                    print(e.code, file=sys.stderr)
+                status = e.code if isinstance(e.code, int) else int(e.code is not None)
+
+        return status, stdout.getvalue(), stderr.getvalue()
+
+    def inner(args: Namespace):
+        import json
+
+        assert deferred_saves is None, "batch cannot run inside another batch or alias"
+        assert args.every is None or args.every > 0, "--every must be at least 1"
+
+        options = queue_options(args)
+        quiet = globals.QUIET_OPTION_SET
+        ran, failed = 0, None
+        try:
+            with deferring_saves() as saves, contextlib.ExitStack() as stack:
+                if args.source == "-":
+                    source = sys.stdin
+                else:
+                    try:
+                        source = stack.enter_context(open(args.source, "r", encoding="utf-8"))
+                    except FileNotFoundError:
+                        raise AssertionError(f"batch file not found at path '{args.source}'")
+
+                for number, argv in batch_commands(source, args.format):
+                    status, stdout, stderr = run(options + argv, args.report)
+
+                    if args.report:
+                        record = {
+                            "line": number,
+                            "status": status,
+                            "stdout": util.ANSI_ESCAPE.sub("", stdout),
+                            "stderr": stderr,
+                        }
+                        print(json.dumps(record), flush=True)
+
+                    if status != 0:
+                        failed = number
+                        break
+
+                    ran += 1
+                    if args.every is not None and ran % args.every == 0:
+                        saves.flush()
+
+                assert failed is None, f"batch stopped at line {failed}, changes since the last save were discarded"
+
+        finally:
+            globals.QUIET_OPTION_SET = quiet
+
+        if not globals.QUIET_OPTION_SET and not args.report:
+            print(
+                util.star_symbol_surround(
+                    f"ran {ran} commands", consts.STAR_MSG_OUTPUT_WIDTH
+                )
+            )
+
+    parser.add_argument(
+        "source",
+        nargs="?",
+        default="-",
+        help="file with one command per line (default: read from stdin)",
+    )
+    parser.add_argument(
+        "--format",
+        default="auto",
+        choices=["auto", "lines", "jsonl"],
+        help="shell words or JSON argument lists per line (default: auto, lines starting with [ or { are JSON)",
+    )
+    parser.add_argument(
+        "--every",
+        type=int,
+        default=None,
+        help="save changed task queues after every N commands instead of only at the end",
+    )
+    parser.add_argument(
+        "--report",
+        action="store_true",
+        help="print the status and output of every command as a JSON line",
+    )
+
+    return inner
+
+
+def daemon(parser: ArgumentParser, root: ArgumentParser):
+    """keep task queues loaded in memory and run the commands of other tqb calls"""
+    import daemon as server
+
+    def inner(args: Namespace):
+        assert not args.stop, "no daemon is running"
+        assert deferred_saves is None, "daemon cannot run inside a batch"
+        server.serve(root, server.socket_path())
+
+    parser.add_argument("--stop", action="store_true", help="stop the running daemon")
+
+    return inner
+
+
 def config(parser: ArgumentParser, root: ArgumentParser):
     """subcommand for editing config entries"""
 
     def ls(sparser: ArgumentParser):
         """list config entries"""
 
-        @tqb_serialize
+        @tqb_header
         def inner(taskq: TaskQueue, args: Namespace):
             headers = consts.CONFIG_HEADERS
 
@@ -756,10 +1086,7 @@ def config(parser: ArgumentParser, root: ArgumentParser):
 
         @tqb_serialize
         def inner(taskq: TaskQueue, args: Namespace):
-            for idx, cfg in enumerate(taskq.config.configs):
-                if cfg.Key == args.key and cfg.Value == args.value:
-                    taskq.config.configs.pop(idx)
-                    break
+            taskq.config.remove(args.key, args.value)
 
             if not globals.QUIET_OPTION_SET:
                 print(
@@ -818,7 +1145,7 @@ def constraint(parser: ArgumentParser, root: ArgumentParser):
 
             for pair in args.properties:
                 k, _, v = pair.partition("=")
-                constraint.__dict__[k] = v
+                taskq.alter_constraint(constraint, k, v)
 
             if not globals.QUIET_OPTION_SET:
                 print(
@@ -845,7 +1172,7 @@ def constraint(parser: ArgumentParser, root: ArgumentParser):
                     args.column in consts.CONSTRAINTS_HEADERS
                 ), f"column '{column}' is invalid"
 
-                constraint.__dict__[args.column] = args.value
+                taskq.alter_constraint(constraint, args.column, args.value)
 
             if not globals.QUIET_OPTION_SET:
                 print(
@@ -879,8 +1206,7 @@ def constraint(parser: ArgumentParser, root: ArgumentParser):
             constraint = taskq.find_constraint_fallback(target)
             parsed_column = constraint.__dict__[column].split("|")
             parsed_column.extend(args.properties)
-            constraint.__dict__[column] = "|".join(parsed_column)
-            taskq.constraints[target] = constraint
+            taskq.alter_constraint(constraint, column, "|".join(parsed_column))
 
             if not globals.QUIET_OPTION_SET:
                 print(
@@ -905,7 +1231,7 @@ def constraint(parser: ArgumentParser, root: ArgumentParser):
             assert (
                 target in taskq.constraints
             ), "constraint with HeaderName {target} could not be found"
-            del taskq.constraints[args.target]
+            taskq.remove_constraint(args.target)
 
             if not globals.QUIET_OPTION_SET:
                 print(
@@ -921,7 +1247,7 @@ def constraint(parser: ArgumentParser, root: ArgumentParser):
     def ls(sparser: ArgumentParser):
         """list constraints"""
 
-        @tqb_serialize
+        @tqb_header
         def inner(taskq: TaskQueue, args: Namespace):
             headers = args.columns if args.columns else consts.CONSTRAINTS_HEADERS
 
@@ -947,19 +1273,17 @@ def constraint(parser: ArgumentParser, root: ArgumentParser):
         """dump constraint column and config information of taskqueue to STDOUT"""
 
         def inner(args: Namespace):
-            with open(args.path, "r") as fp:
-                lines = fp.readlines()
-
-            it = iter(lines)
-            blueprint = list(
-                itertools.takewhile(
-                    lambda x: not x.startswith(consts.CONSTRAINTS_END), it
-                )
-            )
-            blueprint.append(consts.CONSTRAINTS_END + "\n")
-            blueprint.append(next(it))
+            # the header text of a csv queue is only current once its journal
+            # of column changes has been compacted into it
+            csv_backend = storage.backend_for(args.path, args.backend) == "csv"
+            if csv_backend and not os.path.exists(journal.journal_path(args.path)):
+                print(parsing.read_header_text(args.path))
+                return
 
-            print("".join(blueprint))
+            taskq = load_queue(args, header_only=True)
+            writer = csv.writer(sys.stdout)
+            parsing.write_header_sections(writer, taskq)
+            writer.writerow(taskq.headers)
 
         return inner
 
@@ -980,9 +1304,14 @@ COMMANDS = [
     show,
     archive,
     remove,
+    compact,
+    export,
+    import_,
     column,
     constraint,
     alias,
     config,
+    batch,
+    daemon,
     help,
 ]
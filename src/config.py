@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional, Self, Callable, Any
 
 
@@ -19,6 +19,11 @@ class ConfigPair:
 @dataclass
 class Config:
     configs: list[ConfigPair]
+    dirty: bool = field(default=False, repr=False, compare=False)
+    # the pairs of each key by value, built on first lookup and dropped on change
+    lookup: dict[str, dict[str, ConfigPair]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
 
     @classmethod
     def empty(cls) -> Self:
@@ -34,6 +39,16 @@ class Config:
 
     def add_config_pair(self, pair: ConfigPair):
         self.configs.append(pair)
+        self.lookup.clear()
+        self.dirty = True
+
+    def remove(self, key: str, value: str) -> Optional[ConfigPair]:
+        for idx, pair in enumerate(self.configs):
+            if pair.Key == key and pair.Value == value:
+                self.lookup.clear()
+                self.dirty = True
+                return self.configs.pop(idx)
+        return None
 
     def get(self, key: str) -> Optional[ConfigPair]:
         return next((pair for pair in self.configs if pair.Key == key), None)
@@ -41,12 +56,41 @@ class Config:
     def get_all(self, key: str) -> list[ConfigPair]:
         return [pair for pair in self.configs if pair.Key == key]
 
+    def find(self, key: str, value: str) -> Optional[ConfigPair]:
+        """the first pair with key and value, keys with many pairs such as
+        aliases are indexed by value on first use"""
+        if key not in self.lookup:
+            pairs = self.lookup[key] = {}
+            for pair in self.configs:
+                if pair.Key == key:
+                    pairs.setdefault(pair.Value, pair)
+
+        return self.lookup[key].get(value)
+
     def get_value(self, key: str, default: Optional[Any] = None) -> Optional[str]:
         pair = self.get(key)
         if pair:
             return pair.Value
         return default
 
+    def get_count(self, key: str, default: int = 0) -> int:
+        """the value of key as a whole number of zero or more"""
+        value = self.get_value(key)
+        if not value:
+            return default
+
+        assert value.isdigit(), f"config {key} must be a whole number of zero or more, got '{value}'"
+        return int(value)
+
+    def set_value(self, key: str, value: str):
+        pair = self.get(key)
+        if pair and pair.Value != value:
+            pair.Value = value
+            self.lookup.clear()
+            self.dirty = True
+        elif not pair:
+            self.add_config_pair(ConfigPair(key, value, ""))
+
     def get_and_apply[T](self, key: str, func: Callable[[ConfigPair], T]):
         q = self.get(key)
         if q is not None:
@@ -1,13 +1,19 @@
 import consts
 from dataclasses import dataclass
+from datetime import date
+import re
 import fnmatch
 from colorama import Fore
 from typing import Self, Any, Callable, Optional
 
 
+FALSE_VALUES = ("FALSE", "False", "false", "0", "")
+
 CONSTRAINT_MAP: dict[str, Callable[[str], Any]] = {
     "int": int,
-    "bool": lambda x: x not in ("FALSE", "False", "false", "0", ""),
+    "float": float,
+    "bool": lambda x: x if isinstance(x, bool) else x not in FALSE_VALUES,
+    "date": lambda x: x if isinstance(x, date) else date.fromisoformat(x),
 }
 
 
@@ -24,6 +30,21 @@ class Constraint:
     Hide: bool
     AutoHeader: bool
 
+    def __post_init__(self):
+        self.dirty = False
+        self.compiled = None
+
+    def __setattr__(self, name: str, value: Any):
+        super().__setattr__(name, value)
+        if name in consts.CONSTRAINTS_HEADERS:
+            super().__setattr__("dirty", True)
+            super().__setattr__("compiled", None)
+
+    def compile(self) -> "CompiledConstraint":
+        if self.compiled is None:
+            self.compiled = CompiledConstraint.build(self)
+        return self.compiled
+
     @classmethod
     def empty(cls, header_name: str) -> Self:
         return cls(
@@ -71,34 +92,14 @@ class Constraint:
         return row
 
     def apply_colour(self, value: Any) -> str:
-        def get_clr(name: str) -> str:
-            if name.startswith("#"):
-                if len(name) != 7:
-                    return Fore.RESET
-
-                try:
-                    r, g, b = int(name[1:3], 16), int(name[3:5], 16), int(name[5:], 16)
-                    return f"\033[38;2;{r};{g};{b}m"
-
-                except ValueError:
-                    return Fore.RESET
-
-            return Fore.__dict__.get(name, Fore.RESET)
-
         if not isinstance(value, str):
             value = str(value)
 
-        colours = self.Colours.split("|")
-        if not colours:
+        colour = self.compile().colour(value.lower())
+        if colour is None:
             return value
 
-        for cpair in colours:
-            pattern, _, colour = cpair.partition("=")
-
-            if fnmatch.fnmatch(value.lower(), pattern.lower()):
-                return get_clr(colour) + str(value) + Fore.RESET
-
-        return value
+        return colour + value + Fore.RESET
 
     def apply_default(self, value: str) -> Any:
         return self.Default or value
@@ -113,25 +114,106 @@ class Constraint:
                 )
         return value
 
+    def decode(self, value: Any) -> Any:
+        """convert a stored cell to the column type, empty cells and cells that
+        do not convert are kept as they are"""
+        if value == "" and self.Type != "bool":
+            return value
+
+        try:
+            return CONSTRAINT_MAP[self.Type](value)
+        except (ValueError, TypeError):
+            return value
+
     def get_variant_constraints(self) -> list[str]:
         return [""] + self.Variant.split("|")
 
     def constrain_variant(self, value: str) -> str:
-        lvalue = str(value).lower()
-
-        if self.Variant:
-            for variant in self.get_variant_constraints():
-                lvariant = variant.lower()
-
-                if self.Autofill:
-                    if lvariant.startswith(lvalue):
-                        return variant
-
-                if lvariant == lvalue:
-                    return variant
+        if not self.Variant:
+            return value
 
+        variant = self.compile().variant(str(value).lower())
+        if variant is None:
             raise AssertionError(
                 f"column {self.HeaderName} must be one of {tuple(self.get_variant_constraints())}"
             )
 
-        return value
+        return variant
+
+
+def colour_code(name: str) -> str:
+    if name.startswith("#"):
+        if len(name) != 7:
+            return Fore.RESET
+
+        try:
+            r, g, b = int(name[1:3], 16), int(name[3:5], 16), int(name[5:], 16)
+            return f"\033[38;2;{r};{g};{b}m"
+
+        except ValueError:
+            return Fore.RESET
+
+    return Fore.__dict__.get(name, Fore.RESET)
+
+
+@dataclass
+class CompiledConstraint:
+    """lookup tables for the Colours and Variant rules of a constraint
+
+    colour rules apply in order and the first match wins, exact rules are
+    looked up in a dict and glob rules are combined into one regex
+    """
+
+    exact_colours: dict[str, tuple[int, str]]
+    glob_colours: list[tuple[int, str]]
+    glob_pattern: Optional[re.Pattern]
+    variants: dict[str, str]
+    ordinals: dict[str, int]
+
+    @classmethod
+    def build(cls, constraint: Constraint) -> Self:
+        exact_colours, glob_colours, globs = {}, [], []
+        for idx, cpair in enumerate(constraint.Colours.split("|")):
+            pattern, _, colour = cpair.partition("=")
+            pattern = pattern.lower()
+
+            if any(c in pattern for c in "*?["):
+                glob_colours.append((idx, colour_code(colour)))
+                globs.append(f"({fnmatch.translate(pattern)})")
+            else:
+                exact_colours.setdefault(pattern, (idx, colour_code(colour)))
+
+        glob_pattern = re.compile("|".join(globs)) if globs else None
+
+        # every name constrain_variant accepts, autofill accepts any prefix
+        # and earlier variants win
+        # position of each variant for sorting, empty cells sort after them
+        ordinals = {}
+        for variant in constraint.Variant.split("|") if constraint.Variant else []:
+            ordinals.setdefault(variant.lower(), len(ordinals))
+
+        variants = {}
+        for variant in constraint.get_variant_constraints() if constraint.Variant else []:
+            lvariant = variant.lower()
+            if constraint.Autofill:
+                for end in range(len(lvariant) + 1):
+                    variants.setdefault(lvariant[:end], variant)
+            else:
+                variants.setdefault(lvariant, variant)
+
+        return cls(exact_colours, glob_colours, glob_pattern, variants, ordinals)
+
+    def colour(self, lvalue: str) -> Optional[str]:
+        exact = self.exact_colours.get(lvalue)
+        if self.glob_pattern is None or (exact and exact[0] < self.glob_colours[0][0]):
+            return exact[1] if exact else None
+
+        match = self.glob_pattern.match(lvalue)
+        if match is None:
+            return exact[1] if exact else None
+
+        idx, colour = self.glob_colours[match.lastindex - 1]
+        return exact[1] if exact and exact[0] < idx else colour
+
+    def variant(self, lvalue: str) -> Optional[str]:
+        return self.variants.get(lvalue)
@@ -17,6 +17,25 @@ CONFIG_HEADERS = ("Key", "Value", "Opt")
 CONFIG_END = "# END CONFIG"
 
 CONFIG_ALIAS_NAMESPACE = "Alias"
+CONFIG_ID_COUNTER = "IdCounter"
+CONFIG_SNAPSHOT_CACHE = "SnapshotCache"
+
+CONFIG_JOURNAL_MAX_SIZE = "JournalMaxSize"
+
+SNAPSHOT_SUFFIX = ".tqbcache"
+SNAPSHOT_VERSION = 11
+
+INDEX_SUFFIX = ".tqbidx"
+ARCHIVE_SUFFIX = ".archive"
+
+JOURNAL_SUFFIX = ".journal"
+JOURNAL_MAX_SIZE = 256 * 1024
+
+DAEMON_PROTOCOL = "tqb1"
+DAEMON_SOCKET_NAME = "tqb.sock"
+DAEMON_SOCKET_ENV = "TQB_SOCKET"
+DAEMON_DISABLE_ENV = "TQB_NO_DAEMON"
+DAEMON_RUN_LOCALLY = -1
 
 HEADER_ID_STRING = "Id"
 
@@ -0,0 +1,251 @@
+import os
+import sys
+import stat
+import socket
+import struct
+from typing import Optional
+
+import consts
+
+# a request is the protocol name, the working directory of the client, its
+# terminal size as COLUMNSxLINES (empty when stdout is not a terminal) and the
+# arguments, every field terminated by a NUL byte
+#
+# the response is a "<status> <stdout length>\n" line followed by the captured
+# stdout and then stderr, a status of DAEMON_RUN_LOCALLY asks the client to
+# run the command itself
+#
+# the socket lives in a directory only its user can enter and both sides
+# check that the process at the other end runs as the same user, another user
+# can neither see the arguments of a command nor answer it
+#
+# only the server side imports the rest of tqb, clients that forward their
+# arguments stay fast
+
+
+def socket_path() -> str:
+    if path := os.environ.get(consts.DAEMON_SOCKET_ENV):
+        return path
+
+    if runtime := os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(runtime, consts.DAEMON_SOCKET_NAME)
+
+    return os.path.join(f"/tmp/{consts.APP_NAME}-{os.getuid()}", consts.DAEMON_SOCKET_NAME)
+
+
+def private_dir(path: str) -> bool:
+    """whether path is a directory, not a symlink, that only this user can use"""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+
+    return stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid() and not st.st_mode & 0o077
+
+
+def peer_is_self(conn: socket.socket, path: str) -> bool:
+    """whether the process at the other end of conn runs as this user"""
+    if hasattr(socket, "SO_PEERCRED"):
+        creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        _, uid, _ = struct.unpack("3i", creds)
+    else:
+        # the socket file belongs to whoever bound it
+        uid = os.stat(path).st_uid
+
+    return uid == os.getuid()
+
+
+def connect(path: str) -> Optional[socket.socket]:
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except OSError:
+        client.close()
+        return None
+
+    return client
+
+
+def receive_all(conn: socket.socket) -> bytes:
+    chunks = []
+    while chunk := conn.recv(1 << 16):
+        chunks.append(chunk)
+
+    return b"".join(chunks)
+
+
+def terminal_field() -> str:
+    if not sys.stdout.isatty():
+        return ""
+
+    columns, lines = os.get_terminal_size(sys.stdout.fileno())
+    return f"{columns}x{lines}"
+
+
+def encode_request(argv: list[str], cwd: str, terminal: str) -> bytes:
+    fields = [consts.DAEMON_PROTOCOL, cwd, terminal, *argv]
+    return b"".join(os.fsencode(field) + b"\0" for field in fields)
+
+
+def decode_request(data: bytes) -> tuple[str, str, list[str]]:
+    fields = [os.fsdecode(field) for field in data.split(b"\0")[:-1]]
+    assert len(fields) >= 3 and fields[0] == consts.DAEMON_PROTOCOL, "malformed daemon request"
+
+    return fields[1], fields[2], fields[3:]
+
+
+def forward(argv: list[str]) -> Optional[int]:
+    """run argv on the daemon if one is running and print its output, returns
+    the exit status or None if the command has to run in this process"""
+    if os.environ.get(consts.DAEMON_DISABLE_ENV):
+        return None
+
+    path = socket_path()
+    client = connect(path)
+    if client is None:
+        return None
+
+    if not peer_is_self(client, path):
+        client.close()
+        print(f"{consts.APP_NAME}: ignoring daemon socket {path} owned by another user", file=sys.stderr)
+        return None
+
+    with client:
+        client.sendall(encode_request(argv, os.getcwd(), terminal_field()))
+        client.shutdown(socket.SHUT_WR)
+        response = receive_all(client)
+
+    header, newline, body = response.partition(b"\n")
+    if not newline:
+        print(f"{consts.APP_NAME}: daemon closed the connection", file=sys.stderr)
+        return 1
+
+    status, stdout_length = map(int, header.split())
+    if status == consts.DAEMON_RUN_LOCALLY:
+        return None
+
+    sys.stdout.buffer.write(body[:stdout_length])
+    sys.stdout.flush()
+    sys.stderr.buffer.write(body[stdout_length:])
+    sys.stderr.flush()
+    return status
+
+
+def handle(root, data: bytes) -> tuple[int, str, str, bool]:
+    """run one request, returns its exit status, stdout, stderr and whether
+    the daemon was asked to stop"""
+    import io
+    import traceback
+    import contextlib
+
+    import util
+    import globals
+    import program
+    import storage
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    status, stop, terminal = 0, False, ""
+
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            cwd, terminal, argv = decode_request(data)
+            os.chdir(cwd)
+            if terminal:
+                columns, _, lines = terminal.partition("x")
+                globals.TERMINAL_SIZE = int(columns), int(lines)
+
+            parsed = root.parse_args(argv)
+            # stdin of the client is not forwarded, a batch read from it runs there
+            subcommand = getattr(parsed, "subcommand", None)
+            if parsed.less or parsed.clear or (subcommand == "batch" and parsed.source == "-"):
+                return consts.DAEMON_RUN_LOCALLY, "", "", False
+
+            if subcommand == "daemon":
+                assert parsed.stop, f"a daemon is already running at {socket_path()}"
+                print(f"{consts.APP_NAME} daemon stopped")
+                stop = True
+            else:
+                program.runner_with_handling(root, argv)
+
+        except SystemExit as e:
+            if isinstance(e.code, str):
+                print(e.code, file=sys.stderr)
+            status = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except AssertionError as e:
+            print(f"{consts.APP_NAME}: {e}", file=sys.stderr)
+            status = 1
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        finally:
+            globals.TERMINAL_SIZE = None
+            globals.USE_LESS_FOR_OUTPUT = False
+            globals.QUIET_OPTION_SET = False
+
+    # a failed command may have changed a queue without saving it
+    if status != 0:
+        storage.resident.clear()
+
+    output = stdout.getvalue()
+    if not terminal:
+        output = util.ANSI_ESCAPE.sub("", output)
+
+    return status, output, stderr.getvalue(), stop
+
+
+def serve(root, path: str):
+    """answer requests on the unix socket at path until asked to stop, queues
+    stay parsed in memory between requests"""
+    import storage
+
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    assert private_dir(
+        directory
+    ), f"{directory} must be a directory only you can access (mode 0700) to hold the daemon socket"
+
+    client = connect(path)
+    if client is not None:
+        client.close()
+    assert client is None, f"a daemon is already running at {path}"
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(umask)
+
+    storage.resident = storage.ResidentQueues()
+    print(f"{consts.APP_NAME} daemon listening on {path}", flush=True)
+
+    try:
+        with server:
+            server.listen()
+            stop = False
+            while not stop:
+                conn, _ = server.accept()
+                with conn:
+                    if not peer_is_self(conn, path):
+                        continue
+
+                    status, stdout, stderr, stop = handle(root, receive_all(conn))
+                    stdout, stderr = stdout.encode("utf-8"), stderr.encode("utf-8")
+                    try:
+                        conn.sendall(f"{status} {len(stdout)}\n".encode() + stdout + stderr)
+                    except OSError:
+                        pass
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        storage.resident = None
+        if os.path.exists(path):
+            os.remove(path)
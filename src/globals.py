@@ -1,3 +1,4 @@
 USE_LESS_FOR_OUTPUT: bool = False
 LS_OUTPUT_TRUNCATED: bool = False
 QUIET_OPTION_SET: bool = False
+TERMINAL_SIZE: tuple[int, int] | None = None
@@ -0,0 +1,59 @@
+import bisect
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+
+@dataclass
+class SortedIndex:
+    """ids of tasks ordered by the typed value of a column, for range lookups"""
+
+    keys: list[Any] = field(default_factory=list)
+    ids: list[int] = field(default_factory=list)
+
+    @classmethod
+    def build(cls, cells: list[tuple[Any, int]]) -> "SortedIndex":
+        cells = sorted(cell for cell in cells if indexable(cell[0]))
+        return cls([value for value, _ in cells], [id for _, id in cells])
+
+    def add(self, value: Any, id: int):
+        if not indexable(value):
+            return
+
+        pos = bisect.bisect_right(self.keys, value)
+        self.keys.insert(pos, value)
+        self.ids.insert(pos, id)
+
+    def discard(self, value: Any, id: int):
+        if not indexable(value):
+            return
+
+        lo = bisect.bisect_left(self.keys, value)
+        hi = bisect.bisect_right(self.keys, value)
+        for pos in range(lo, hi):
+            if self.ids[pos] == id:
+                del self.keys[pos]
+                del self.ids[pos]
+                return
+
+    def between(
+        self,
+        lo: Optional[Any] = None,
+        hi: Optional[Any] = None,
+        lo_inclusive: bool = True,
+        hi_inclusive: bool = True,
+    ) -> set[int]:
+        """ids with a value between lo and hi, a missing bound is unbounded"""
+        start = 0
+        if lo is not None:
+            start = (bisect.bisect_left if lo_inclusive else bisect.bisect_right)(self.keys, lo)
+
+        end = len(self.keys)
+        if hi is not None:
+            end = (bisect.bisect_right if hi_inclusive else bisect.bisect_left)(self.keys, hi)
+
+        return set(self.ids[start:end])
+
+
+def indexable(value: Any) -> bool:
+    """cells that did not decode to the column type are left out"""
+    return not isinstance(value, str)
@@ -0,0 +1,132 @@
+import os
+import json
+from typing import Any
+
+from tasks import Task, TaskQueue
+import consts
+
+
+def journal_path(path: str) -> str:
+    return path + consts.JOURNAL_SUFFIX
+
+
+def encode_cell(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+def encode_entry(entry: list[Any]) -> list[Any]:
+    match entry:
+        case ["add", items]:
+            return ["add", {k: encode_cell(v) for k, v in items.items()}]
+        case ["set", id, header, value]:
+            return ["set", id, header, encode_cell(value)]
+        case _:
+            return entry
+
+
+def read(path: str, offset: int = 0) -> tuple[list[list[Any]], int]:
+    """read committed batches from the journal of path, starting at byte offset
+
+    returns the batches and the offset just past the last complete batch
+    """
+    try:
+        fp = open(journal_path(path), "rb")
+    except FileNotFoundError:
+        return [], 0
+
+    with fp:
+        fp.seek(offset)
+
+        batches = []
+        for line in fp:
+            if not line.endswith(b"\n"):
+                break  # torn write, the batch was never committed
+
+            batches.append(json.loads(line))
+            offset += len(line)
+
+    return batches, offset
+
+
+def append(path: str, entries: list[list[Any]]) -> int:
+    """commit entries to the journal as a single batch, returns the journal size"""
+    batch = json.dumps([encode_entry(e) for e in entries]) + "\n"
+
+    with open(journal_path(path), "a+b") as fp:
+        discard_torn_tail(fp)
+        fp.write(batch.encode("utf-8"))
+        fp.flush()
+        os.fsync(fp.fileno())
+
+        return fp.tell()
+
+
+def discard_torn_tail(fp):
+    size = fp.seek(0, os.SEEK_END)
+    if size == 0:
+        return
+
+    fp.seek(size - 1)
+    if fp.read(1) == b"\n":
+        return
+
+    fp.seek(0)
+    data = fp.read()
+    fp.truncate(data.rfind(b"\n") + 1)
+    fp.seek(0, os.SEEK_END)
+
+
+def apply(tq: TaskQueue, batches: list[list[Any]], schema_only: bool = False):
+    """replay journal batches on top of tq
+
+    entries are keyed by primary key and column name and replaying them is
+    idempotent, so a journal left behind by an interrupted compaction is harmless
+    """
+    for batch in batches:
+        for entry in batch:
+            if entry[0] == "column":
+                apply_column(tq, entry[1:])
+                continue
+
+            if schema_only:
+                continue
+
+            match entry:
+                case ["add", items]:
+                    row = [items.get(h, "") for h in tq.headers]
+                    task = Task.deserialize(row, tq.headers, tq)
+                    tq.unload_task(task.id)
+                    tq.load_task(task)
+                case ["set", id, header, value]:
+                    task = tq.find(id)
+                    if task is not None and header in task.items:
+                        task.items[header] = value
+                case ["remove", id]:
+                    tq.remove_task(id)
+                case _:
+                    raise AssertionError(f"invalid journal entry {entry}")
+
+
+def apply_column(tq: TaskQueue, entry: list[Any]):
+    match entry:
+        case ["add", header]:
+            if header not in tq.headers:
+                tq.add_column(header)
+        case ["move", header, index]:
+            if header in tq.headers:
+                tq.move_column(header, index)
+        case ["rename", header, name]:
+            if header in tq.headers and name not in tq.headers:
+                tq.rename_column(header, name)
+        case ["remove", header]:
+            if header in tq.headers:
+                tq.remove_column(header)
+        case _:
+            raise AssertionError(f"invalid journal entry {['column', *entry]}")
+
+
+def remove(path: str):
+    try:
+        os.remove(journal_path(path))
+    except FileNotFoundError:
+        pass
@@ -1,34 +1,70 @@
 import sys
 import argparse
 from argparse import ArgumentParser
-import cmds
 import consts
+import daemon
 import globals
 import os
 import program
 
 
+class LazySubParsersAction(argparse._SubParsersAction):
+    """subparsers that only run the command factory of the subcommand being
+    parsed, every subcommand is still registered with its help text so the
+    program help lists all of them"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.factories = {}
+
+    def add_command(self, cmd_factory, root: ArgumentParser):
+        name = cmd_factory.__name__.rstrip("_")
+        self.add_parser(name, help=cmd_factory.__doc__)
+        self.factories[name] = cmd_factory, root
+
+    def build(self, name: str):
+        if name not in self.factories:
+            return
+
+        cmd_factory, root = self.factories.pop(name)
+        parser = self._name_parser_map[name]
+        func = cmd_factory(parser, root)
+
+        if func is not None:
+            parser.set_defaults(func=func)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        self.build(values[0])
+        super().__call__(parser, namespace, values, option_string)
+
+
 def program_argument_parser() -> argparse.ArgumentParser:
+    import cmds
+    import storage
+
     root = argparse.ArgumentParser(prog=consts.APP_NAME, add_help=False)
     root.add_argument("-h", "--help", action="store_true", help="show the help message")
     root.add_argument("-p", "--path", default=consts.DEFAULT_PATH, help=f"path to task queue file (default: {consts.DEFAULT_PATH})")
+    root.add_argument("-b", "--backend", default=None, choices=storage.BACKENDS, help="storage backend of the task queue file (default: from file extension)")
     root.add_argument("-v", "--version", action="version", version=consts.APP_VERSION_STRING, help="print version")
     root.add_argument("-c", "--clear", action="store_true", help="clear terminal before displaying task queue")
     root.add_argument("-q", "--quiet", action="store_true", help="do not output status messages")
     root.add_argument("--less", action="store_true", help="use 'less' to display output")
-    subcmd = root.add_subparsers(help="subcommands", dest="subcommand")
+    subcmd = root.add_subparsers(
+        help="subcommands", dest="subcommand", action=LazySubParsersAction
+    )
 
     for cmd_factory in cmds.COMMANDS:
-        parser = subcmd.add_parser(cmd_factory.__name__, help=cmd_factory.__doc__)
-        func = cmd_factory(parser, root)
-
-        if func is not None:
-            parser.set_defaults(func=func)
+        subcmd.add_command(cmd_factory, root)
 
     return root
 
 
 def main(argv: list[str]):
+    status = daemon.forward(argv[1:])
+    if status is not None:
+        sys.exit(status)
+
     program.runner_with_handling(program_argument_parser(), argv[1:])
 
 
@@ -1,69 +1,531 @@
-from constraints import Constraint
+from typing import Optional, Any
+from contextlib import contextmanager
+from datetime import date
+from constraints import Constraint, CONSTRAINT_MAP
 from tasks import TaskQueue, Task
 from config import ConfigPair, Config
+from index import SortedIndex
+from search import SearchIndex
+import io
+import os
 import csv
+import json
+import mmap
+import functools
+import shutil
 import itertools
+import journal
 import consts
 
 
+def snapshot_path(path: str) -> str:
+    return path + consts.SNAPSHOT_SUFFIX
+
+
+def snapshot_enabled(tq: TaskQueue) -> bool:
+    return CONSTRAINT_MAP["bool"](tq.config.get_value(consts.CONFIG_SNAPSHOT_CACHE, ""))
+
+
+# hashlib is only needed with SnapshotCache enabled, it is imported where
+# snapshots are read or written to keep startup fast
+#
+# a snapshot is a "tqbsnap <version>" line followed by plain lists, dicts and
+# sets in marshal format, decoding it never runs code, so a snapshot that was
+# planted next to the queue or written by an older tqb is at worst ignored
+
+
+def file_signature(path: str) -> tuple[int, int, str]:
+    import hashlib
+
+    with open(path, "rb") as fp:
+        stat = os.fstat(fp.fileno())
+        digest = hashlib.blake2b(fp.read(), digest_size=16).hexdigest()
+
+    return stat.st_size, stat.st_mtime_ns, digest
+
+
+@contextmanager
+def atomic_open(path: str, mode: str = "w", **kwargs):
+    """open a temporary file that replaces path once it has been synced to disk"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, mode, **kwargs) as fp:
+            yield fp
+            fp.flush()
+            os.fsync(fp.fileno())
+
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_bytes(path: str, data: bytes):
+    with atomic_open(path, "wb") as fp:
+        fp.write(data)
+
+
+def snapshot_magic() -> bytes:
+    return f"tqbsnap {consts.SNAPSHOT_VERSION}\n".encode()
+
+
+def date_headers(tq: TaskQueue) -> set[str]:
+    return {h for h in tq.headers if tq.find_constraint_fallback(h).Type == "date"}
+
+
+def encode_dates(values: list[Any]) -> list[Any]:
+    return [v.toordinal() if isinstance(v, date) else v for v in values]
+
+
+def decode_dates(values: list[Any]) -> list[Any]:
+    # cells that did not decode to a date are kept as strings
+    return [date.fromordinal(v) if type(v) is int else v for v in values]
+
+
+def snapshot_data(tq: TaskQueue) -> tuple:
+    """the parsed queue and its indexes as plain values, with the row of each
+    task as rows are not always in task order"""
+    dates = date_headers(tq)
+    columns = {
+        h: encode_dates(column) if h in dates else column for h, column in tq.columns.items()
+    }
+    sorted_indexes = {
+        h: (encode_dates(index.keys) if h in dates else index.keys, index.ids)
+        for h, index in tq.sorted_indexes.items()
+    }
+    search = tq.search_index
+    return (
+        tq.headers,
+        [cfg.serialize() for cfg in tq.config.configs],
+        [constraint.serialize() for constraint in tq.constraints.values()],
+        tq.id_counter,
+        tq.archive_loaded,
+        tq.column_aliases,
+        list(tq.tasks),
+        [task.row for task in tq.tasks.values()],
+        columns,
+        tq.postings,
+        sorted_indexes,
+        None if search is None else (search.postings, search.trigrams),
+    )
+
+
+def snapshot_queue(data: tuple) -> TaskQueue:
+    """rebuild the queue written by snapshot_data, raises on malformed data"""
+    (
+        headers, configs, constraint_rows, id_counter, archive_loaded, aliases,
+        ids, rows, columns, postings, sorted_indexes, search,
+    ) = data
+
+    for row in constraint_rows:
+        if len(row) != len(consts.CONSTRAINTS_HEADERS) or (row[1] and row[1] not in CONSTRAINT_MAP):
+            raise ValueError(f"invalid constraint {row}")
+
+    if list(columns) != headers or any(len(c) != len(ids) for c in columns.values()):
+        raise ValueError("columns do not match the tasks")
+
+    if len(rows) != len(ids) or (rows and (min(rows) < 0 or max(rows) >= len(ids))):
+        raise ValueError("rows do not match the tasks")
+
+    tq = TaskQueue(
+        {row[0]: Constraint(*row) for row in constraint_rows},
+        {},
+        headers,
+        Config([ConfigPair(*row) for row in configs]),
+        id_counter=id_counter,
+        archive_loaded=archive_loaded,
+        column_aliases=aliases,
+        columns=columns,
+        rows=len(ids),
+        postings=postings,
+    )
+    tq.tasks = {id: Task(id, row, tq) for id, row in zip(ids, rows)}
+
+    dates = date_headers(tq)
+    for h in dates:
+        columns[h] = decode_dates(columns[h])
+
+    for h, (keys, index_ids) in sorted_indexes.items():
+        tq.sorted_indexes[h] = SortedIndex(decode_dates(keys) if h in dates else keys, index_ids)
+
+    if search is not None:
+        tq.search_index = SearchIndex(*search)
+
+    return tq
+
+
+@contextmanager
+def gc_paused():
+    """decoding a snapshot creates containers by the million, none of them
+    garbage, the collector would walk them over and over while they are made"""
+    import gc
+
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def snapshot_trusted(fp) -> bool:
+    """a snapshot is only read if it was written by this user and nobody
+    else can rewrite it"""
+    stat = os.fstat(fp.fileno())
+    if hasattr(os, "getuid") and stat.st_uid != os.getuid():
+        return False
+
+    return not stat.st_mode & 0o022
+
+
+def write_snapshot(path: str, tq: TaskQueue, journal_offset: int = 0):
+    import marshal
+
+    tq.compact_rows()
+    tq.build_indexes()
+    data = marshal.dumps((file_signature(path), journal_offset, snapshot_data(tq)))
+    atomic_write_bytes(snapshot_path(path), snapshot_magic() + data)
+    os.chmod(snapshot_path(path), 0o600)
+
+
+def load_snapshot(path: str) -> Optional[tuple[TaskQueue, int]]:
+    """load the sidecar snapshot for path and the journal offset it includes,
+    None if missing, stale, not enabled for the queue or not trusted"""
+    spath = snapshot_path(path)
+    if not os.path.exists(spath):
+        return None
+
+    if not snapshot_enabled(read_header(csv.reader(io.StringIO(read_header_text(path))))):
+        return None
+
+    try:
+        fp = open(spath, "rb")
+    except OSError:
+        return None
+
+    import marshal
+
+    with fp:
+        if not snapshot_trusted(fp) or fp.readline() != snapshot_magic():
+            return None
+
+        try:
+            with gc_paused():
+                signature, journal_offset, data = marshal.loads(fp.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+    if signature != file_signature(path):
+        return None
+
+    # the data is only plain values, anything that does not fit the layout is
+    # a snapshot to rebuild rather than an error
+    try:
+        with gc_paused():
+            return snapshot_queue(data), journal_offset
+    except Exception:
+        return None
+
+
+def remove_snapshot(path: str):
+    try:
+        os.remove(snapshot_path(path))
+    except FileNotFoundError:
+        pass
+
+
+def journal_max_size(tq: TaskQueue) -> int:
+    return tq.config.get_count(consts.CONFIG_JOURNAL_MAX_SIZE, consts.JOURNAL_MAX_SIZE)
+
+
 def serialize(path: str, tq: TaskQueue):
-    with open(path, "w+", encoding="utf-8") as fp:
-        writer = csv.writer(fp)
-        writer.writerow([consts.CONFIG_BEGIN])
-        writer.writerow(consts.CONFIG_HEADERS)
+    if tq.needs_rewrite() or not os.path.exists(path):
+        return compact(path, tq)
+
+    if not tq.journal:
+        return
 
-        for cfg in tq.config.configs:
-            writer.writerow(cfg.serialize())
+    max_size = journal_max_size(tq)
+    if not max_size or journal.append(path, tq.journal) > max_size:
+        return compact(path, tq)
 
-        writer.writerow([consts.CONFIG_END])
+    tq.mark_clean()
 
-        writer.writerow([consts.CONSTRAINTS_BEGIN])
-        writer.writerow(consts.CONSTRAINTS_HEADERS)
 
-        for constraint in tq.constraints.values():
-            writer.writerow(constraint.serialize())
+def compact(path: str, tq: TaskQueue):
+    """rewrite the whole queue file and drop the journal it supersedes"""
+    serialize_csv(path, tq)
+    journal.remove(path)
+    tq.mark_clean()
 
-        writer.writerow([consts.CONSTRAINTS_END])
+    if snapshot_enabled(tq):
+        write_snapshot(path, tq)
+    else:
+        remove_snapshot(path)
+
+
+def deserialize(path: str) -> TaskQueue:
+    snapshot = load_snapshot(path)
+    if snapshot is not None:
+        tq, journal_offset = snapshot
+    else:
+        tq, journal_offset = deserialize_csv(path), 0
+
+    tq.archive_loader = functools.partial(read_archive, path)
+
+    batches, journal_offset = journal.read(path, journal_offset)
+    journal.apply(tq, batches)
+    tq.mark_clean()
+
+    if snapshot is None and snapshot_enabled(tq):
+        write_snapshot(path, tq, journal_offset)
+
+    return tq
+
+
+def index_path(path: str) -> str:
+    return path + consts.INDEX_SUFFIX
+
+
+def write_index(path: str, offsets: dict[str, int]):
+    stat = os.stat(path)
+    index = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, **offsets}
+    atomic_write_bytes(index_path(path), json.dumps(index).encode("utf-8"))
+
+
+def load_index(path: str) -> Optional[dict[str, int]]:
+    """load the section offsets of path, None if missing or stale"""
+    try:
+        with open(index_path(path), "rb") as fp:
+            index = json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+    stat = os.stat(path)
+    if index.get("size") != stat.st_size or index.get("mtime_ns") != stat.st_mtime_ns:
+        return None
+
+    return index
+
+
+def serialize_csv(path: str, tq: TaskQueue):
+    tq.sync_id_counter()
+
+    if not tq.archive_loaded and archive_reshaped(path, tq):
+        tq.load_archive()
+
+    live, archived = [], []
+    for task in tq.tasks.values():
+        (archived if task.is_archived() else live).append(task)
+
+    write_archive(path, tq, archived)
+    tq.column_aliases.clear()
+
+    with atomic_open(path, "w", encoding="utf-8") as fp:
+        writer = csv.writer(fp)
+        write_config_section(writer, tq)
+        constraints_offset = fp.tell()
+
+        write_constraints_section(writer, tq)
+        headers_offset = fp.tell()
 
         # Write the task headers for the tasks
         writer.writerow(tq.headers)
+        tasks_offset = fp.tell()
 
-        for task in tq.tasks:
+        for task in live:
             writer.writerow(task.serialize())
 
+    write_index(
+        path,
+        {
+            "constraints": constraints_offset,
+            "headers": headers_offset,
+            "tasks": tasks_offset,
+        },
+    )
 
-def deserialize(path: str) -> TaskQueue:
-    with open(path, "r", encoding="utf-8") as fp:
+
+def archive_path(path: str) -> str:
+    return path + consts.ARCHIVE_SUFFIX
+
+
+def write_archive(path: str, tq: TaskQueue, archived: list[Task]):
+    """write archived tasks to the archive segment of path
+
+    if the segment was never loaded it still holds every task archived
+    before, so the newly archived tasks are appended to it instead
+    """
+    apath = archive_path(path)
+
+    if not tq.archive_loaded and os.path.exists(apath):
+        if not archived:
+            return
+
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(task.serialize() for task in archived)
+
+        with open(apath, "a+b") as fp:
+            journal.discard_torn_tail(fp)
+            fp.write(buffer.getvalue().encode("utf-8"))
+            fp.flush()
+            os.fsync(fp.fileno())
+        return
+
+    if not archived:
+        if os.path.exists(apath):
+            os.remove(apath)
+        return
+
+    with atomic_open(apath, "w", encoding="utf-8") as fp:
+        writer = csv.writer(fp)
+        writer.writerow(tq.headers)
+        writer.writerows(task.serialize() for task in archived)
+
+
+def read_archive_headers(path: str) -> Optional[list[str]]:
+    try:
+        with open(archive_path(path), "r", encoding="utf-8") as fp:
+            return next(csv.reader(fp), [])
+    except FileNotFoundError:
+        return None
+
+
+def archive_reshaped(path: str, tq: TaskQueue) -> bool:
+    """whether columns changed since the archive segment was written, its
+    rows then have to be rewritten instead of appended to"""
+    headers = read_archive_headers(path)
+    if headers is None:
+        return False
+
+    return headers != tq.headers or any(
+        tq.archive_header(h) != h for h in tq.column_aliases
+    )
+
+
+def read_archive(path: str, tq: TaskQueue) -> list[Task]:
+    """read the archive segment, its rows may predate column changes recorded
+    since it was written so cells are matched to headers by name"""
+    try:
+        fp = open(archive_path(path), "r", encoding="utf-8")
+    except FileNotFoundError:
+        return []
+
+    with fp:
         reader = csv.reader(fp)
+        headers = next(reader, None) or []
+        sources = [tq.archive_header(h) for h in tq.headers]
 
-        # Take until CONFIG_BEGIN
-        list(itertools.takewhile(lambda x: len(x) == 0 or x[0] != consts.CONFIG_BEGIN, reader))
+        tasks = []
+        for row in reader:
+            if not row: continue
+            items = dict(zip(headers, row))
+            row = [items.get(h, "") if h is not None else "" for h in sources]
+            tasks.append(Task.deserialize(row, tq.headers, tq))
 
-        _ = next(reader)
+    return tasks
 
-        config_rows = list(
-            itertools.takewhile(lambda x: len(x) == 0 or x[0] != consts.CONFIG_END, reader)
-        )
 
-        configs = [ConfigPair.deserialize(row) for row in config_rows]
+def write_header_sections(writer, tq: TaskQueue):
+    write_config_section(writer, tq)
+    write_constraints_section(writer, tq)
+
+
+def write_config_section(writer, tq: TaskQueue):
+    writer.writerow([consts.CONFIG_BEGIN])
+    writer.writerow(consts.CONFIG_HEADERS)
+
+    for cfg in tq.config.configs:
+        writer.writerow(cfg.serialize())
 
-        # Take until CONSTRAINTS_BEGIN
-        list(itertools.takewhile(lambda x: x[0] != consts.CONSTRAINTS_BEGIN, reader))
+    writer.writerow([consts.CONFIG_END])
 
-        # Constraint headers
-        _ = next(reader)
 
-        constr_row = list(
-            itertools.takewhile(lambda x: x[0] != consts.CONSTRAINTS_END, reader)
+def write_constraints_section(writer, tq: TaskQueue):
+    writer.writerow([consts.CONSTRAINTS_BEGIN])
+    writer.writerow(consts.CONSTRAINTS_HEADERS)
+
+    for constraint in tq.constraints.values():
+        writer.writerow(constraint.serialize())
+
+    writer.writerow([consts.CONSTRAINTS_END])
+
+
+def read_header_text(path: str) -> str:
+    """read the config and constraint sections and the task header row of path
+    without reading any task rows"""
+    index = load_index(path)
+
+    with open(path, "rb") as fp:
+        if index is not None:
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return mm[: index["tasks"]].decode("utf-8").replace("\r\n", "\n")
+
+    with open(path, "r", encoding="utf-8") as fp:
+        lines = list(
+            itertools.takewhile(lambda x: not x.startswith(consts.CONSTRAINTS_END), fp)
         )
-        constraints = list(map(Constraint.deserialize, constr_row))
-        c_dict = {c.HeaderName: c for c in constraints}
-        headers = next(reader)
+        lines.append(consts.CONSTRAINTS_END + "\n")
+        lines.append(next(fp))
+
+    return "".join(lines)
+
+
+def read_header(reader) -> TaskQueue:
+    """build a queue without tasks from the sections before the task rows,
+    consuming reader up to and including the task header row"""
+    # Take until CONFIG_BEGIN
+    list(itertools.takewhile(lambda x: len(x) == 0 or x[0] != consts.CONFIG_BEGIN, reader))
+
+    _ = next(reader)
+
+    config_rows = list(
+        itertools.takewhile(lambda x: len(x) == 0 or x[0] != consts.CONFIG_END, reader)
+    )
+
+    configs = [ConfigPair.deserialize(row) for row in config_rows]
+
+    # Take until CONSTRAINTS_BEGIN
+    list(itertools.takewhile(lambda x: x[0] != consts.CONSTRAINTS_BEGIN, reader))
+
+    # Constraint headers
+    _ = next(reader)
+
+    constr_row = list(
+        itertools.takewhile(lambda x: x[0] != consts.CONSTRAINTS_END, reader)
+    )
+    constraints = list(map(Constraint.deserialize, constr_row))
+    c_dict = {c.HeaderName: c for c in constraints}
+    headers = next(reader)
+
+    config = Config.from_list(configs)
+    id_counter = config.get_count(consts.CONFIG_ID_COUNTER)
+
+    return TaskQueue(c_dict, {}, headers, config=config, id_counter=id_counter)
+
+
+def deserialize_header(path: str) -> TaskQueue:
+    tq = read_header(csv.reader(io.StringIO(read_header_text(path))))
+    journal.apply(tq, journal.read(path)[0], schema_only=True)
+    tq.mark_clean()
+    return tq
+
+
+def deserialize_csv(path: str) -> TaskQueue:
+    with open(path, "r", encoding="utf-8") as fp:
+        reader = csv.reader(fp)
+        tq = read_header(reader)
 
-        tq = TaskQueue(c_dict, [], headers, config=Config.from_list(configs))
         for row in reader:
             if not row: continue
-            task = Task.deserialize(row, headers, tq)
-            tq.add_task(task)
+            task = Task.deserialize(row, tq.headers, tq)
+            tq.load_task(task)
 
+    tq.archive_loaded = False
+    tq.mark_clean()
     return tq
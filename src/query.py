@@ -0,0 +1,369 @@
+import re
+import heapq
+import fnmatch
+import itertools
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from tasks import Task, TaskQueue
+from constraints import Constraint
+from search import words as search_words, score as search_score
+
+
+def iter_tasks(
+    taskq: TaskQueue, oldest: bool = False, ids: Optional[set[int]] = None
+) -> Iterator[Task]:
+    """tasks in id order, newest first unless oldest, limited to ids if given"""
+    if ids is not None:
+        return (taskq.tasks[id] for id in sorted(ids, reverse=not oldest))
+
+    tasks = taskq.tasks.values()
+    return iter(tasks) if oldest else reversed(tasks)
+
+
+def drop_archived(tasks: Iterable[Task]) -> Iterator[Task]:
+    return (task for task in tasks if not task.is_archived())
+
+
+GLOB_CHARACTERS = "*?["
+
+
+def compile_glob(pattern: str) -> Callable[[str], bool]:
+    """compile a case insensitive glob into a matcher for lowercased values"""
+    pattern = pattern.lower()
+    if not any(c in pattern for c in GLOB_CHARACTERS):
+        return pattern.__eq__
+
+    return re.compile(fnmatch.translate(pattern)).match
+
+
+def compile_substring(needle: str) -> Callable[[str], bool]:
+    needle = needle.lower()
+    if not any(c in needle for c in GLOB_CHARACTERS):
+        return lambda value: needle in value
+
+    return compile_glob(f"*{needle}*")
+
+
+CLAUSE_PATTERN = re.compile(r"(.*?)(<=|>=|!=|<|>|=)(.*)", re.DOTALL)
+RANGE_SEPARATOR = ".."
+
+Bounds = tuple[Any, Any, bool, bool]
+
+
+def parse_clause(taskq: TaskQueue, clause: str) -> tuple[str, str, str]:
+    """split a filter clause into its header, operator and value"""
+    match = CLAUSE_PATTERN.fullmatch(clause)
+    column, op, value = match.groups() if match else (clause, "=", "")
+
+    header = taskq.smart_header_match(column)
+    assert header, f"column match for {column}"
+    return header, op, value
+
+
+def clause_bounds(constraint: Constraint, op: str, value: str) -> Optional[Bounds]:
+    """typed bounds of a comparison or a lo..hi range clause, either end of a
+    range may be left out, None for glob clauses"""
+    if op == "!=" or (op == "=" and (not constraint.Type or RANGE_SEPARATOR not in value)):
+        return None
+
+    assert constraint.Type, f"'{op}' needs a typed column, {constraint.HeaderName} has no Type"
+
+    if op == "=":
+        lo, _, hi = value.partition(RANGE_SEPARATOR)
+        return (
+            constraint.constrain_type(lo) if lo else None,
+            constraint.constrain_type(hi) if hi else None,
+            True,
+            True,
+        )
+
+    bound = constraint.constrain_type(value)
+    return {
+        "<": (None, bound, True, False),
+        "<=": (None, bound, True, True),
+        ">": (bound, None, False, True),
+        ">=": (bound, None, True, True),
+    }[op]
+
+
+def in_bounds(value: Any, lo: Any, hi: Any, lo_inclusive: bool, hi_inclusive: bool) -> bool:
+    if isinstance(value, str):
+        return False  # empty or not of the column type
+    if lo is not None and (value < lo if lo_inclusive else value <= lo):
+        return False
+    if hi is not None and (value > hi if hi_inclusive else value >= hi):
+        return False
+    return True
+
+
+def compile_clause(taskq: TaskQueue, clause: str) -> Callable[[Task], bool]:
+    header, op, value = parse_clause(taskq, clause)
+    constraint = taskq.find_constraint_fallback(header)
+    column = taskq.columns[header]
+
+    bounds = clause_bounds(constraint, op, value)
+    if bounds is not None:
+        return lambda task: in_bounds(column[task.row], *bounds)
+
+    if constraint.Variant:
+        value = constraint.constrain_variant(value)
+
+    matches = compile_glob(value)
+    if op == "!=":
+        return lambda task: not matches(str(column[task.row]).lower())
+
+    return lambda task: bool(matches(str(column[task.row]).lower()))
+
+
+def clause_candidates(taskq: TaskQueue, clause: str) -> Optional[set[int]]:
+    """ids of the tasks matching a clause from a sorted index or posting list, None otherwise"""
+    header, op, value = parse_clause(taskq, clause)
+    constraint = taskq.find_constraint_fallback(header)
+
+    bounds = clause_bounds(constraint, op, value)
+    if bounds is not None:
+        if header not in taskq.sorted_indexes and not taskq.resident:
+            return None
+        return taskq.sorted_index(header).between(*bounds)
+
+    if op != "=" or not constraint.Variant:
+        return None
+
+    if header not in taskq.postings and not taskq.resident:
+        return None
+
+    matches = compile_glob(constraint.constrain_variant(value))
+    postings = taskq.posting_list(header)
+    return set().union(*(ids for key, ids in postings.items() if matches(key)))
+
+
+def search_scores(taskq: TaskQueue, search: str) -> Optional[dict[int, int]]:
+    """scores of the tasks that may contain search from the search index, None otherwise"""
+    if "[" in search or taskq.search_index is None:
+        return None
+
+    scores = taskq.search_index.scores(search)
+    if scores is None:
+        return None
+
+    matches = compile_substring(search)
+    for header in taskq.text_headers():
+        if header in taskq.indexed_text_headers():
+            continue
+
+        for key, ids in taskq.posting_list(header).items():
+            if matches(key):
+                scores.update((id, scores.get(id, 0)) for id in ids)
+
+    return scores
+
+
+def compile_search_rank(taskq: TaskQueue, search: str, oldest: bool = False) -> Callable[[Task], Any]:
+    """sort key putting the best matches for search first, newest first on ties"""
+    scores = search_scores(taskq, search)
+
+    if scores is None:
+        fragments = search_words(search)
+        score = lambda task: search_score(search_words(taskq.indexed_text(task)), fragments)
+    else:
+        score = lambda task: scores.get(task.id, 0)
+
+    return lambda task: (-score(task), task.id if oldest else -task.id)
+
+
+def candidate_ids(
+    taskq: TaskQueue,
+    where: Optional[list[str]] = None,
+    whereor: Optional[list[str]] = None,
+    search: Optional[str] = None,
+) -> Optional[set[int]]:
+    """narrow the tasks an ls filter can match using indexes, None if nothing
+    can be answered from them and every task has to be tested
+
+    indexes are only used once they exist, or built when the queue stays
+    resident, building one costs more than the scan it saves for a single query
+    """
+    narrowed = [ids for ids in (clause_candidates(taskq, c) for c in where or []) if ids is not None]
+
+    any_ids = [clause_candidates(taskq, clause) for clause in whereor or []]
+    if any_ids and all(ids is not None for ids in any_ids):
+        narrowed.append(set().union(*any_ids))
+
+    scores = search_scores(taskq, search) if search is not None else None
+    if scores is not None:
+        narrowed.append(set(scores))
+
+    if not narrowed:
+        return None
+
+    narrowed.sort(key=len)
+    return narrowed[0].intersection(*narrowed[1:])
+
+
+def compile_search(taskq: TaskQueue, search: str) -> Callable[[Task], bool]:
+    matches = compile_substring(search)
+    columns = [taskq.columns[h] for h in taskq.text_headers()]
+    return lambda task: any(matches(str(column[task.row]).lower()) for column in columns)
+
+
+def compile_filter(
+    taskq: TaskQueue,
+    where: Optional[list[str]] = None,
+    whereor: Optional[list[str]] = None,
+    search: Optional[str] = None,
+) -> Optional[Callable[[Task], bool]]:
+    """compile ls filter arguments into a single predicate, None if there are none"""
+    tests: list[Callable[[Task], bool]] = []
+
+    if whereor:
+        any_clauses = [compile_clause(taskq, clause) for clause in whereor]
+        tests.append(lambda task: any(test(task) for test in any_clauses))
+
+    if where:
+        tests.extend(compile_clause(taskq, clause) for clause in where)
+
+    if search is not None:
+        tests.append(compile_search(taskq, search))
+
+    if not tests:
+        return None
+
+    if len(tests) == 1:
+        return tests[0]
+
+    return lambda task: all(test(task) for test in tests)
+
+
+class KeyTable(dict):
+    """memo of sort keys for the few distinct values of a column"""
+
+    def __init__(self, compute: Callable[[Any], Any]):
+        super().__init__()
+        self.compute = compute
+
+    def __missing__(self, value: Any) -> Any:
+        key = self[value] = self.compute(value)
+        return key
+
+
+class Descending:
+    """sort key wrapper reversing the order of the value it holds"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __lt__(self, other: "Descending") -> bool:
+        return other.value < self.value
+
+    def __eq__(self, other: Any) -> bool:
+        return self.value == other.value
+
+
+def parse_sort(taskq: TaskQueue, spec: str) -> list[tuple[str, bool]]:
+    """split a comma separated list of column[:asc|:desc] sort keys into
+    headers and whether they sort descending"""
+    keys = []
+    for part in spec.split(","):
+        column, _, direction = part.partition(":")
+
+        header = taskq.smart_header_match(column.strip())
+        assert header, f"sorting column {column} is not a valid header"
+        assert direction.lower() in ("", "asc", "desc"), f"sort direction {direction} must be asc or desc"
+
+        keys.append((header, direction.lower() == "desc"))
+
+    return keys
+
+
+def compile_column_key(taskq: TaskQueue, header: str, descending: bool = False) -> Callable[[Task], Any]:
+    """sort key on the cells of header, Variant columns sort by the position
+    of their value in the Variant list, typed columns sort on the decoded
+    cells and cells that are not of the column type (empty or undecodable)
+    sort after the typed ones"""
+    column = taskq.columns[header]
+    constraint = taskq.find_constraint_fallback(header)
+
+    # only the values are reversed for :desc, the flag putting cells outside
+    # the Variant list or the column type last stays ascending
+    if constraint.Variant:
+        ordinals = constraint.compile().ordinals
+        sign = -1 if descending else 1
+
+        def ordinal(value: Any) -> tuple[bool, int]:
+            position = ordinals.get(str(value).lower())
+            return position is None, 0 if position is None else sign * position
+
+        table = KeyTable(ordinal)
+        return lambda task: table[column[task.row]]
+
+    if descending:
+
+        def key(task: Task) -> tuple[bool, Any]:
+            value = column[task.row]
+            return isinstance(value, str), Descending(value)
+
+        return key
+
+    def key(task: Task) -> tuple[bool, Any]:
+        value = column[task.row]
+        return isinstance(value, str), value
+
+    return key
+
+
+def compile_sort_key(taskq: TaskQueue, spec: str, reverse: bool = False) -> Callable[[Task], Any]:
+    """sort key for an ls --sort spec, computed once per task by take, reverse
+    flips the direction of every column"""
+    keys = [compile_column_key(taskq, h, d != reverse) for h, d in parse_sort(taskq, spec)]
+    if len(keys) == 1:
+        return keys[0]
+
+    return lambda task: tuple([key(task) for key in keys])
+
+
+def apply_predicate(
+    tasks: Iterable[Task], predicate: Optional[Callable[[Task], bool]]
+) -> Iterator[Task]:
+    return iter(tasks) if predicate is None else filter(predicate, tasks)
+
+
+def take(
+    tasks: Iterable[Task],
+    limit: Optional[int] = None,
+    key: Optional[Callable[[Task], Any]] = None,
+    count: bool = False,
+) -> tuple[list[Task], bool, Optional[int]]:
+    """collect at most limit tasks from the stream
+
+    returns the page, whether the stream held more tasks than the page and
+    the total number of tasks in the stream (None if it was not consumed)
+    """
+    tasks = iter(tasks)
+
+    if key is not None:
+        counter = itertools.count()
+        counted = (task for task, _ in zip(tasks, counter))
+
+        if limit is None:
+            page = sorted(counted, key=key)
+        else:
+            page = heapq.nsmallest(limit, counted, key=key)
+
+        total = next(counter)
+        return page, total > len(page), total
+
+    if limit is None:
+        page = list(tasks)
+        return page, False, len(page)
+
+    page = list(itertools.islice(tasks, limit))
+    if len(page) < limit:
+        return page, False, len(page)
+
+    if count:
+        remaining = sum(1 for _ in tasks)
+        return page, remaining > 0, len(page) + remaining
+
+    return page, next(tasks, None) is not None, None
@@ -0,0 +1,107 @@
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# match quality of a search word against an indexed word
+EXACT, PREFIX, SUBSTRING = 3, 2, 1
+
+
+def words(text: str) -> set[str]:
+    return set(WORD_PATTERN.findall(text.lower()))
+
+
+def trigrams(word: str) -> set[str]:
+    return {word[idx : idx + 3] for idx in range(len(word) - 2)}
+
+
+def quality(word: str, fragment: str) -> int:
+    if word == fragment:
+        return EXACT
+    if word.startswith(fragment):
+        return PREFIX
+    return SUBSTRING if fragment in word else 0
+
+
+def score(text_words: set[str], fragments: set[str]) -> int:
+    """sum of the best match of every fragment in text_words, 0 if one is missing"""
+    total = 0
+    for fragment in fragments:
+        best = max((quality(word, fragment) for word in text_words), default=0)
+        if not best:
+            return 0
+        total += best
+
+    return total
+
+
+@dataclass
+class SearchIndex:
+    """inverted index from the words of text cells to task ids, with a trigram
+    index over the words so substrings are resolved without scanning every word"""
+
+    postings: dict[str, set[int]] = field(default_factory=dict)
+    trigrams: dict[str, set[str]] = field(default_factory=dict)
+
+    def add(self, id: int, text: str):
+        for word in words(text):
+            ids = self.postings.get(word)
+            if ids is None:
+                ids = self.postings[word] = set()
+                for gram in trigrams(word):
+                    self.trigrams.setdefault(gram, set()).add(word)
+            ids.add(id)
+
+    def discard(self, id: int, text: str):
+        for word in words(text):
+            ids = self.postings.get(word)
+            if ids is None:
+                continue
+
+            ids.discard(id)
+            if ids:
+                continue
+
+            del self.postings[word]
+            for gram in trigrams(word):
+                grams = self.trigrams[gram]
+                grams.discard(word)
+                if not grams:
+                    del self.trigrams[gram]
+
+    def words_containing(self, fragment: str) -> list[str]:
+        grams = trigrams(fragment)
+        if not grams:
+            return [word for word in self.postings if fragment in word]
+
+        found = set.intersection(*(self.trigrams.get(g, set()) for g in grams))
+        return [word for word in found if fragment in word]
+
+    def scores(self, search: str) -> Optional[dict[int, int]]:
+        """score the tasks that may contain search by how well their words match
+        the words of search, None if search has no words to look up
+
+        every word of search has to be found, so tasks missing from the result
+        cannot contain search in an indexed cell
+        """
+        fragments = words(search)
+        if not fragments:
+            return None
+
+        scores: Optional[dict[int, int]] = None
+        for fragment in fragments:
+            best: dict[int, int] = {}
+            for word in self.words_containing(fragment):
+                word_quality = quality(word, fragment)
+                for id in self.postings[word]:
+                    if best.get(id, 0) < word_quality:
+                        best[id] = word_quality
+
+            if scores is None:
+                scores = best
+            else:
+                scores = {id: score + best[id] for id, score in scores.items() if id in best}
+
+        return scores
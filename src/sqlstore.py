@@ -0,0 +1,320 @@
+import os
+import sqlite3
+import functools
+from contextlib import closing
+from typing import Any, Optional
+
+from tasks import Task, TaskQueue
+from constraints import Constraint, FALSE_VALUES
+from config import ConfigPair, Config
+from journal import encode_cell
+import query
+import consts
+
+
+def quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def connect(path: str) -> sqlite3.Connection:
+    return sqlite3.connect(path)
+
+
+def header_pk(tq: TaskQueue) -> Optional[str]:
+    constraint = tq.find_constraint("Role", "PrimaryKey")
+    return constraint.HeaderName if constraint else None
+
+
+def indexed_headers(tq: TaskQueue) -> list[str]:
+    return [h for h in tq.headers if tq.find_constraint_fallback(h).Variant]
+
+
+def column_definition(tq: TaskQueue, header: str) -> str:
+    if header == header_pk(tq):
+        return f"{quote(header)} INTEGER PRIMARY KEY"
+
+    if tq.find_constraint_fallback(header).Variant:
+        return f"{quote(header)} TEXT COLLATE NOCASE"
+
+    return f"{quote(header)} TEXT"
+
+
+def task_columns(tq: TaskQueue) -> str:
+    return ", ".join(quote(h) for h in tq.headers)
+
+
+def constraint_columns() -> str:
+    return ", ".join(quote(h) for h in consts.CONSTRAINTS_HEADERS)
+
+
+def write_all(db: sqlite3.Connection, tq: TaskQueue):
+    tq.load_archive()
+
+    for table in ("config", "constraints", "headers", "tasks"):
+        db.execute(f"DROP TABLE IF EXISTS {table}")
+
+    definitions = ", ".join(f"{quote(h)} TEXT" for h in consts.CONSTRAINTS_HEADERS)
+    db.execute("CREATE TABLE config (Position INTEGER PRIMARY KEY, Key TEXT, Value TEXT, Opt TEXT)")
+    db.execute(f"CREATE TABLE constraints (Position INTEGER PRIMARY KEY, {definitions})")
+    db.execute("CREATE TABLE headers (Position INTEGER PRIMARY KEY, Name TEXT)")
+
+    if tq.headers:
+        definitions = ", ".join(column_definition(tq, h) for h in tq.headers)
+        db.execute(f"CREATE TABLE tasks ({definitions})")
+
+        for header in indexed_headers(tq):
+            db.execute(
+                f"CREATE INDEX {quote('tasks_' + header)} ON tasks ({quote(header)})"
+            )
+
+    tq.sync_id_counter()
+
+    db.executemany(
+        "INSERT INTO config (Key, Value, Opt) VALUES (?, ?, ?)",
+        (cfg.serialize() for cfg in tq.config.configs),
+    )
+
+    write_schema(db, tq)
+
+    if tq.headers:
+        placeholders = ", ".join("?" for _ in tq.headers)
+        db.executemany(
+            f"INSERT INTO tasks ({task_columns(tq)}) VALUES ({placeholders})",
+            ([encode_cell(v) for v in task.serialize()] for task in tq.tasks.values()),
+        )
+
+
+def write_journal(db: sqlite3.Connection, tq: TaskQueue):
+    pk = quote(header_pk(tq))
+
+    for entry in tq.journal:
+        match entry:
+            case ["add", items]:
+                columns = ", ".join(quote(h) for h in items)
+                placeholders = ", ".join("?" for _ in items)
+                db.execute(
+                    f"INSERT INTO tasks ({columns}) VALUES ({placeholders})",
+                    [encode_cell(v) for v in items.values()],
+                )
+            case ["set", id, header, value]:
+                db.execute(
+                    f"UPDATE tasks SET {quote(header)} = ? WHERE {pk} = ?",
+                    (encode_cell(value), id),
+                )
+            case ["remove", id]:
+                db.execute(f"DELETE FROM tasks WHERE {pk} = ?", (id,))
+            case ["column", *change]:
+                write_column_change(db, change)
+
+    if any(entry[0] == "add" for entry in tq.journal):
+        write_config_value(db, consts.CONFIG_ID_COUNTER, str(tq.id_counter))
+
+    if any(entry[0] == "column" for entry in tq.journal):
+        write_schema(db, tq)
+
+
+def write_column_change(db: sqlite3.Connection, change: list[Any]):
+    match change:
+        case ["add", header]:
+            db.execute(f"ALTER TABLE tasks ADD COLUMN {quote(header)} TEXT DEFAULT ''")
+        case ["rename", header, name]:
+            db.execute(f"ALTER TABLE tasks RENAME COLUMN {quote(header)} TO {quote(name)}")
+        case ["remove", header]:
+            for (index,) in db.execute(
+                "SELECT DISTINCT il.name FROM pragma_index_list('tasks') AS il,"
+                " pragma_index_info(il.name) AS ii WHERE ii.name = ?",
+                (header,),
+            ).fetchall():
+                db.execute(f"DROP INDEX {quote(index)}")
+            db.execute(f"ALTER TABLE tasks DROP COLUMN {quote(header)}")
+
+
+def write_schema(db: sqlite3.Connection, tq: TaskQueue):
+    """rewrite the constraints and headers tables, task rows are left as is"""
+    db.execute("DELETE FROM constraints")
+    db.execute("DELETE FROM headers")
+
+    placeholders = ", ".join("?" for _ in consts.CONSTRAINTS_HEADERS)
+    db.executemany(
+        f"INSERT INTO constraints ({constraint_columns()}) VALUES ({placeholders})",
+        ([encode_cell(v) for v in c.serialize()] for c in tq.constraints.values()),
+    )
+    db.executemany("INSERT INTO headers (Name) VALUES (?)", ((h,) for h in tq.headers))
+
+
+def write_config_value(db: sqlite3.Connection, key: str, value: str):
+    if db.execute("UPDATE config SET Value = ? WHERE Key = ?", (value, key)).rowcount:
+        return
+
+    db.execute("INSERT INTO config (Key, Value, Opt) VALUES (?, ?, '')", (key, value))
+
+
+def serialize(path: str, tq: TaskQueue):
+    if not tq.is_dirty() and os.path.exists(path):
+        return
+
+    exists = os.path.exists(path)
+    with closing(connect(path)) as db, db:
+        if tq.needs_rewrite() or not exists or header_pk(tq) is None:
+            write_all(db, tq)
+        else:
+            write_journal(db, tq)
+
+    tq.mark_clean()
+
+
+def compact(path: str, tq: TaskQueue):
+    with closing(connect(path)) as db:
+        with db:
+            write_all(db, tq)
+        db.execute("VACUUM")
+
+    tq.mark_clean()
+
+
+def clause_sql(tq: TaskQueue, clause: str) -> Optional[tuple[str, list[Any]]]:
+    """translate a clause on an indexed column to sql, None if the clause can
+    only be evaluated in memory"""
+    match = query.CLAUSE_PATTERN.fullmatch(clause)
+    column, op, value = match.groups() if match else (clause, "=", "")
+
+    header = tq.smart_header_match(column)
+    if header is None:
+        return None
+
+    constraint = tq.find_constraint_fallback(header)
+    if header == header_pk(tq):
+        if op == "=" and value.isdigit():
+            return f"{quote(header)} = ?", [int(value)]
+        return bounds_sql(header, query.clause_bounds(constraint, op, value)) if constraint.Type else None
+
+    if op != "=" or any(c in value for c in query.GLOB_CHARACTERS):
+        return None
+
+    if constraint.Variant:
+        return f"{quote(header)} = ?", [constraint.constrain_variant(value)]
+
+    return None
+
+
+def bounds_sql(header: str, bounds: Optional[query.Bounds]) -> Optional[tuple[str, list[Any]]]:
+    if bounds is None:
+        return None
+
+    lo, hi, lo_inclusive, hi_inclusive = bounds
+    conditions, params = [], []
+
+    if lo is not None:
+        conditions.append(f"{quote(header)} {'>=' if lo_inclusive else '>'} ?")
+        params.append(lo)
+    if hi is not None:
+        conditions.append(f"{quote(header)} {'<=' if hi_inclusive else '<'} ?")
+        params.append(hi)
+
+    return "(" + (" AND ".join(conditions) or "1") + ")", params
+
+
+def pushdown(
+    tq: TaskQueue,
+    where: Optional[list[str]] = None,
+    whereor: Optional[list[str]] = None,
+) -> tuple[list[str], list[Any]]:
+    conditions, params = [], []
+
+    for clause in where or []:
+        translated = clause_sql(tq, clause)
+        if translated is not None:
+            conditions.append(translated[0])
+            params.extend(translated[1])
+
+    translated_or = [clause_sql(tq, clause) for clause in whereor or []]
+    if translated_or and all(t is not None for t in translated_or):
+        conditions.append("(" + " OR ".join(sql for sql, _ in translated_or) + ")")
+        params.extend(value for _, values in translated_or for value in values)
+
+    return conditions, params
+
+
+def archived_condition(tq: TaskQueue, archived: bool) -> Optional[str]:
+    constraint = tq.find_constraint("Role", "Archiving")
+    if constraint is None:
+        return None
+
+    column = quote(constraint.HeaderName)
+    false_values = ", ".join(f"'{v}'" for v in FALSE_VALUES)
+
+    if archived:
+        return f"{column} IS NOT NULL AND {column} NOT IN ({false_values})"
+    return f"({column} IS NULL OR {column} IN ({false_values}))"
+
+
+def select_tasks(
+    db: sqlite3.Connection, tq: TaskQueue, conditions: list[str], params: list[Any]
+) -> list[Task]:
+    sql = " WHERE " + " AND ".join(conditions) if conditions else ""
+    order = f" ORDER BY {quote(header_pk(tq))}" if header_pk(tq) else ""
+    rows = db.execute(f"SELECT {task_columns(tq)} FROM tasks{sql}{order}", params)
+
+    return [
+        Task.deserialize([encode_cell(v) for v in row], tq.headers, tq) for row in rows
+    ]
+
+
+def read_archive(path: str, tq: TaskQueue) -> list[Task]:
+    condition = archived_condition(tq, archived=True)
+    if condition is None or not tq.headers:
+        return []
+
+    with closing(connect(path)) as db:
+        return select_tasks(db, tq, [condition], [])
+
+
+def deserialize(
+    path: str,
+    where: Optional[list[str]] = None,
+    whereor: Optional[list[str]] = None,
+    header_only: bool = False,
+) -> TaskQueue:
+    """load the live tasks of the queue at path, archived tasks are loaded on
+    demand and where/whereor clauses on indexed columns are evaluated by sqlite
+    so only matching tasks are loaded"""
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    with closing(connect(path)) as db:
+        configs = [
+            ConfigPair(*row)
+            for row in db.execute("SELECT Key, Value, Opt FROM config ORDER BY Position")
+        ]
+        constraints = [
+            Constraint.deserialize(list(row))
+            for row in db.execute(
+                f"SELECT {constraint_columns()} FROM constraints ORDER BY Position"
+            )
+        ]
+        headers = [name for (name,) in db.execute("SELECT Name FROM headers ORDER BY Position")]
+
+        config = Config.from_list(configs)
+        id_counter = config.get_count(consts.CONFIG_ID_COUNTER)
+        tq = TaskQueue(
+            {c.HeaderName: c for c in constraints},
+            {},
+            headers,
+            config=config,
+            id_counter=id_counter,
+        )
+
+        if headers and not header_only:
+            conditions, params = pushdown(tq, where, whereor)
+
+            live = archived_condition(tq, archived=False)
+            if live is not None:
+                conditions.append(live)
+                tq.archive_loaded = False
+                tq.archive_loader = functools.partial(read_archive, path)
+
+            for task in select_tasks(db, tq, conditions, params):
+                tq.load_task(task)
+
+    tq.mark_clean()
+    return tq
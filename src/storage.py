@@ -0,0 +1,125 @@
+import os
+from typing import Optional
+
+from tasks import TaskQueue
+import parsing
+import consts
+
+# sqlstore pulls in sqlite3 so it is only imported for sqlite queues
+
+BACKENDS = ("csv", "sqlite")
+BACKEND_EXTENSIONS = {".db": "sqlite", ".sqlite": "sqlite", ".sqlite3": "sqlite"}
+
+
+class ResidentQueues:
+    """queues kept parsed in memory between requests by tqb daemon, an entry
+    is only used while none of the files it was read from have changed"""
+
+    def __init__(self):
+        self.entries: dict[str, tuple[tuple, TaskQueue]] = {}
+
+    def signature(self, path: str) -> tuple:
+        signature = []
+        for p in (path, path + consts.JOURNAL_SUFFIX, path + consts.ARCHIVE_SUFFIX):
+            try:
+                stat = os.stat(p)
+                signature.append((stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                signature.append(None)
+
+        return tuple(signature)
+
+    def get(self, path: str) -> Optional[TaskQueue]:
+        entry = self.entries.get(os.path.abspath(path))
+        if entry is None or entry[0] != self.signature(path):
+            return None
+
+        return entry[1]
+
+    def put(self, path: str, tq: TaskQueue):
+        tq.resident = True
+        self.entries[os.path.abspath(path)] = self.signature(path), tq
+
+    def saved(self, path: str, tq: TaskQueue):
+        """tq was written to path, another queue kept for path is now stale"""
+        entry = self.entries.pop(os.path.abspath(path), None)
+        if entry is not None and entry[1] is tq:
+            self.put(path, tq)
+
+    def clear(self):
+        self.entries.clear()
+
+
+# set by tqb daemon, None when every command loads the queue from disk
+resident: Optional[ResidentQueues] = None
+
+
+def backend_for(path: str, backend: Optional[str] = None) -> str:
+    if backend is not None:
+        assert backend in BACKENDS, f"backend must be one of {', '.join(BACKENDS)}"
+        return backend
+
+    return BACKEND_EXTENSIONS.get(os.path.splitext(path)[1].lower(), "csv")
+
+
+def deserialize(
+    path: str,
+    backend: Optional[str] = None,
+    where: Optional[list[str]] = None,
+    whereor: Optional[list[str]] = None,
+) -> TaskQueue:
+    """load the queue at path, backends may use where/whereor to skip loading
+    tasks that cannot match, the result must then never be serialized"""
+    if resident is not None and (tq := resident.get(path)) is not None:
+        return tq
+
+    if backend_for(path, backend) == "sqlite":
+        import sqlstore
+
+        tq = sqlstore.deserialize(path, where, whereor)
+        if where or whereor:
+            return tq
+    else:
+        tq = parsing.deserialize(path)
+
+    if resident is not None:
+        resident.put(path, tq)
+
+    return tq
+
+
+def deserialize_header(path: str, backend: Optional[str] = None) -> TaskQueue:
+    """load only the config, constraints and headers of the queue at path"""
+    if resident is not None and (tq := resident.get(path)) is not None:
+        return tq
+
+    if backend_for(path, backend) == "sqlite":
+        import sqlstore
+
+        return sqlstore.deserialize(path, header_only=True)
+
+    return parsing.deserialize_header(path)
+
+
+def serialize(path: str, tq: TaskQueue, backend: Optional[str] = None):
+    if backend_for(path, backend) == "sqlite":
+        import sqlstore
+
+        sqlstore.serialize(path, tq)
+    else:
+        parsing.serialize(path, tq)
+
+    if resident is not None:
+        resident.saved(path, tq)
+
+
+def compact(path: str, tq: TaskQueue, backend: Optional[str] = None):
+    if backend_for(path, backend) == "sqlite":
+        import sqlstore
+
+        sqlstore.compact(path, tq)
+    else:
+        parsing.compact(path, tq)
+
+    if resident is not None:
+        resident.saved(path, tq)
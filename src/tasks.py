@@ -1,24 +1,34 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
+from collections.abc import MutableMapping
 import csv
+import sys
 import itertools
 import consts
-from typing import Self, Optional, Any
+from typing import Self, Optional, Any, Callable, Iterable, Iterator
 from colorama import Fore
 import fnmatch
-from constraints import Constraint
+from constraints import Constraint, CONSTRAINT_MAP
 from config import Config
+from search import SearchIndex
+from index import SortedIndex
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class Task:
+    """row view of a task, its cells live in the columns of its queue"""
+
     id: int
-    items: dict[str, Any]
+    row: int
     queue: "TaskQueue"
 
+    @property
+    def items(self) -> "TaskItems":
+        return TaskItems(self)
+
     @classmethod
     def new_task(cls, description: str, queue: "TaskQueue") -> Self:
         items: dict[str, Any] = {k: "" for k in queue.headers}
-        pkid = (max(int(task.id) for task in queue.tasks) + 1) if queue.tasks else 1
+        pkid = queue.next_id()
         items[queue.header_pk()] = pkid
         items[queue.header_desc()] = description
 
@@ -34,12 +44,13 @@ class Task:
 
             items[k] = value
 
-        return cls(id=pkid, items=items, queue=queue)
+        return cls(id=pkid, row=queue.new_row(list(items.values())), queue=queue)
 
     def update_column(self, k: str, v: str):
         km = self.queue.smart_header_match(k)
         if km is None:
             raise AssertionError("no existing column {k}")
+        assert km != self.queue.header_pk(), f"the {km} column holds task ids and cannot be updated"
 
         value = v
         constraint = self.queue.find_constraint_fallback(km)
@@ -49,21 +60,23 @@ class Task:
 
         value = constraint.constrain_variant(value)
         value = constraint.constrain_type(value)
-        self.items[km] = value
+        self.queue.set_cell(self, km, value)
+        self.queue.record("set", self.id, km, value)
 
     def geti(self, header: str) -> Any:
         header_guess = self.queue.smart_header_match(header)
-        assert header_guess and header_guess in self.items, f"column match failed for {header}"
-        return self.items[header_guess]
+        assert header_guess and header_guess in self.queue.columns, f"column match failed for {header}"
+        return self.queue.columns[header_guess][self.row]
 
     def seti(self, header: str, value: Any):
         header_guess = self.queue.smart_header_match(header)
-        assert header_guess and header_guess in self.items, f"column match for {header}"
-        self.items[header_guess] = value
+        assert header_guess and header_guess in self.queue.columns, f"column match for {header}"
+        self.queue.set_cell(self, header_guess, value)
+        self.queue.record("set", self.id, header_guess, value)
 
     def matchi(self, header: str, cmp: str) -> bool:
         header_guess = self.queue.smart_header_match(header)
-        assert header_guess and header_guess in self.items, f"column match for {header}"
+        assert header_guess and header_guess in self.queue.columns, f"column match for {header}"
 
         constraint = self.queue.find_constraint_fallback(header_guess)
         item = self.geti(header_guess)
@@ -71,31 +84,35 @@ class Task:
         if constraint.Variant:
             cmp = constraint.constrain_variant(cmp)
 
-        if fnmatch.fnmatch(item.lower(), cmp.lower()):
+        if fnmatch.fnmatch(str(item).lower(), cmp.lower()):
             return True
 
         return False
 
     @staticmethod
-    def _get_pk(header: str, items: dict[str, Any]) -> int:
-        pk = items.get(header)
-        assert pk, f"fatal: PrimaryKey could not be found for Task {items}"
+    def _get_pk(pk: Any, row: list[Any]) -> int:
+        assert pk, f"fatal: PrimaryKey could not be found for Task {row}"
         try:
             return int(pk)
         except ValueError:
-            raise AssertionError(f"fatal: PrimaryKey for Task {items} is not numeric")
+            raise AssertionError(f"fatal: PrimaryKey for Task {row} is not numeric")
 
     @classmethod
     def deserialize(cls, row: list[Any], headers: list[str], queue: "TaskQueue") -> Self:
-        zipped = {k: v for k, v in zip(headers, row)}
-        return cls(cls._get_pk(queue.header_pk(), zipped), zipped, queue)
+        if headers is not queue.headers:
+            zipped = dict(zip(headers, row))
+            row = [zipped.get(h, "") for h in queue.headers]
+
+        pk_index = queue.header_index(queue.header_pk())
+        pk = cls._get_pk(row[pk_index] if pk_index < len(row) else "", row)
+        return cls(pk, queue.new_row(row), queue)
 
     def to_display_row(self, headers: Optional[list[str]] = None) -> list[str]:
         headers = self.queue.get_display_headers() if headers is None else headers
         row = []
         for k in headers:
             constraint = self.queue.find_constraint_fallback(k)
-            item = self.geti(k)
+            item = str(self.queue.columns[k][self.row])
             item = item[: constraint.ColWidth] if constraint.ColWidth else item
             item = constraint.apply_colour(item)
             row.append(item)
@@ -103,23 +120,99 @@ class Task:
         return row
 
     def serialize(self) -> list[Any]:
-        return [self.items.get(k) for k in self.queue.headers]
+        columns = self.queue.columns
+        return [columns[k][self.row] for k in self.queue.headers]
 
     def is_archived(self) -> bool:
         constraint = self.queue.find_constraint("Role", "Archiving")
         if not constraint:
             return False
 
-        value = self.items[self.queue.header_archive()]
+        value = self.queue.columns[constraint.HeaderName][self.row]
         return constraint.constrain_type(value)
 
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Task):
+            return NotImplemented
+        return self.id == other.id and self.serialize() == other.serialize()
+
+
+class TaskItems(MutableMapping):
+    """dict view of the cells of a task, keyed by header"""
+
+    __slots__ = ("task",)
+
+    def __init__(self, task: Task):
+        self.task = task
+
+    def __getitem__(self, header: str) -> Any:
+        return self.task.queue.columns[header][self.task.row]
+
+    def __setitem__(self, header: str, value: Any):
+        assert header in self.task.queue.columns, f"no existing column {header}"
+        self.task.queue.set_cell(self.task, header, value)
+
+    def __delitem__(self, header: str):
+        raise TypeError("cells are removed by removing their column from the queue")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.task.queue.headers)
+
+    def __len__(self) -> int:
+        return len(self.task.queue.headers)
+
+
+def intern_cell(value: Any) -> Any:
+    return sys.intern(value) if type(value) is str else value
+
+
+def posting_add(postings: dict[str, set[int]], value: Any, id: int):
+    postings.setdefault(str(value).lower(), set()).add(id)
+
+
+def posting_discard(postings: dict[str, set[int]], value: Any, id: int):
+    key = str(value).lower()
+    ids = postings.get(key)
+    if ids is not None:
+        ids.discard(id)
+        if not ids:
+            del postings[key]
+
 
 @dataclass
 class TaskQueue:
     constraints: dict[str, Constraint]
-    tasks: list[Task]
+    tasks: dict[int, Task]
     headers: list[str]
     config: Config
+    id_counter: int = field(default=0, repr=False)
+    dirty: bool = field(default=False, repr=False, compare=False)
+    journal: list[list[Any]] = field(default_factory=list, repr=False, compare=False)
+    archive_loaded: bool = field(default=True, repr=False, compare=False)
+    archive_loader: Optional[Callable[["TaskQueue"], Iterable[Task]]] = field(
+        default=None, repr=False, compare=False
+    )
+    lookup_cache: dict[Any, Any] = field(default_factory=dict, repr=False, compare=False)
+    columns: dict[str, list[Any]] = field(default_factory=dict, repr=False, compare=False)
+    rows: int = field(default=0, repr=False, compare=False)
+    dead_rows: int = field(default=0, repr=False, compare=False)
+    column_aliases: dict[str, Optional[str]] = field(
+        default_factory=dict, repr=False, compare=False
+    )
+    postings: dict[str, dict[str, set[int]]] = field(
+        default_factory=dict, repr=False, compare=False
+    )
+    sorted_indexes: dict[str, SortedIndex] = field(
+        default_factory=dict, repr=False, compare=False
+    )
+    search_index: Optional[SearchIndex] = field(default=None, repr=False, compare=False)
+    # kept in memory across commands, indexes then pay off and are built on first use
+    resident: bool = field(default=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.id_counter = max(self.id_counter, max(self.tasks, default=0))
+        for header in self.headers:
+            self.columns.setdefault(header, [""] * self.rows)
 
     @classmethod
     def default(cls) -> Self:
@@ -158,27 +251,336 @@ class TaskQueue:
 
         constraints = {c.HeaderName: c for c in constraint_list}
         return cls(
-            constraints=constraints, headers=headers, tasks=[], config=Config.empty()
+            constraints=constraints, headers=headers, tasks={}, config=Config.empty()
         )
 
     @classmethod
     def from_headers(cls, headers: list[str]) -> Self:
         constraints = {k: Constraint.empty(k) for k in headers}
         tq = cls(
-            constraints=constraints, headers=headers, tasks=[], config=Config.empty()
+            constraints=constraints, headers=headers, tasks={}, config=Config.empty()
         )
         return tq
 
     def add_task(self, task: Task) -> Task:
-        self.tasks.append(task)
+        self.load_task(task)
+        self.record("add", dict(task.items))
+        return task
+
+    def load_task(self, task: Task) -> Task:
+        """index a task read from storage without recording it as a change"""
+        assert task.id not in self.tasks, f"task with id {task.id} already exists"
+        self.tasks[task.id] = task
+        self.id_counter = max(self.id_counter, task.id)
+        self.index_task(task)
         return task
 
+    def unload_task(self, id: int) -> Optional[Task]:
+        """drop a task from the index without recording it as a change"""
+        task = self.tasks.pop(id, None)
+        if task is not None:
+            self.dead_rows += 1
+            self.index_task(task, add=False)
+
+        return task
+
+    def index_task(self, task: Task, add: bool = True):
+        """add or drop the cells of task in the indexes built so far"""
+        for header, postings in self.postings.items():
+            (posting_add if add else posting_discard)(
+                postings, self.columns[header][task.row], task.id
+            )
+
+        for header, ranges in self.sorted_indexes.items():
+            (ranges.add if add else ranges.discard)(self.columns[header][task.row], task.id)
+
+        if self.search_index is not None:
+            (self.search_index.add if add else self.search_index.discard)(
+                task.id, self.indexed_text(task)
+            )
+
+    def index_cell(self, task: Task, header: str, add: bool = True):
+        value = self.columns[header][task.row]
+
+        postings = self.postings.get(header)
+        if postings is not None:
+            (posting_add if add else posting_discard)(postings, value, task.id)
+
+        ranges = self.sorted_indexes.get(header)
+        if ranges is not None:
+            (ranges.add if add else ranges.discard)(value, task.id)
+
+        if self.search_index is not None and header in self.indexed_text_headers():
+            (self.search_index.add if add else self.search_index.discard)(
+                task.id, self.indexed_text(task)
+            )
+
+    def new_row(self, row: list[Any]) -> int:
+        """append the cells of row, ordered as the headers, to the columns"""
+        converters = self.cell_converters()
+        values = itertools.chain(row, itertools.repeat(""))
+
+        for header, value in zip(self.headers, values):
+            convert = converters.get(header)
+            self.columns[header].append(value if convert is None else convert(value))
+
+        self.rows += 1
+        return self.rows - 1
+
+    def set_cell(self, task: Task, header: str, value: Any):
+        convert = self.cell_converters().get(header)
+        value = value if convert is None else convert(value)
+
+        indexed = task.id in self.tasks
+        if indexed:
+            self.index_cell(task, header, add=False)
+
+        self.columns[header][task.row] = value
+
+        if indexed:
+            self.index_cell(task, header)
+
+    def posting_list(self, header: str) -> dict[str, set[int]]:
+        """map the lowercased values of header to the ids of the tasks holding
+        them, built on first use and kept up to date as tasks change"""
+        postings = self.postings.get(header)
+        if postings is None:
+            postings = self.postings[header] = {}
+            column = self.columns[header]
+            for task in self.tasks.values():
+                posting_add(postings, column[task.row], task.id)
+        return postings
+
+    def sorted_index(self, header: str) -> SortedIndex:
+        """ids ordered by the typed cells of header, built on first use and
+        kept up to date as tasks change"""
+        ranges = self.sorted_indexes.get(header)
+        if ranges is None:
+            column = self.columns[header]
+            ranges = self.sorted_indexes[header] = SortedIndex.build(
+                [(column[task.row], task.id) for task in self.tasks.values()]
+            )
+        return ranges
+
+    def build_indexes(self):
+        """build every index a query may use, before the queue is cached"""
+        for header in self.headers:
+            constraint = self.find_constraint_fallback(header)
+            if constraint.Variant:
+                self.posting_list(header)
+            if constraint.Type:
+                self.sorted_index(header)
+
+        self.word_index()
+
+    def text_headers(self) -> list[str]:
+        """headers searched by ls --search, the columns without a Type"""
+        headers = self.lookup_cache.get("text")
+        if headers is None:
+            headers = self.lookup_cache["text"] = [
+                h for h in self.headers if not self.find_constraint_fallback(h).Type
+            ]
+        return headers
+
+    def indexed_text_headers(self) -> list[str]:
+        """text headers covered by the search index, Variant columns are looked
+        up in their posting lists instead"""
+        headers = self.lookup_cache.get("indexed text")
+        if headers is None:
+            headers = self.lookup_cache["indexed text"] = [
+                h for h in self.text_headers() if not self.find_constraint_fallback(h).Variant
+            ]
+        return headers
+
+    def indexed_text(self, task: Task) -> str:
+        return " ".join(str(self.columns[h][task.row]) for h in self.indexed_text_headers())
+
+    def word_index(self) -> SearchIndex:
+        """search index over the indexed text headers, built on first use and
+        kept up to date as tasks change"""
+        if self.search_index is None:
+            self.search_index = SearchIndex()
+            for task in self.tasks.values():
+                self.search_index.add(task.id, self.indexed_text(task))
+        return self.search_index
+
+    def cell_converters(self) -> dict[str, Callable[[Any], Any]]:
+        """conversions applied to cells as they are stored, typed columns are
+        decoded once and cells of variant columns are shared between rows"""
+        converters = self.lookup_cache.get("converters")
+        if converters is None:
+            converters = self.lookup_cache["converters"] = {}
+            for header in self.headers:
+                constraint = self.find_constraint(header)
+                if constraint is None:
+                    continue
+                if constraint.Type in CONSTRAINT_MAP:
+                    converters[header] = constraint.decode
+                elif constraint.Variant:
+                    converters[header] = intern_cell
+        return converters
+
+    def decode_column(self, header: str):
+        convert = self.cell_converters().get(header)
+        if convert is not None and header in self.columns:
+            self.columns[header] = [convert(value) for value in self.columns[header]]
+            self.postings.pop(header, None)
+            self.sorted_indexes.pop(header, None)
+
+    def compact_rows(self):
+        """drop the cells of removed tasks and renumber the rows of the others"""
+        if not self.dead_rows:
+            return
+
+        order = [task.row for task in self.tasks.values()]
+        for header, column in self.columns.items():
+            self.columns[header] = [column[row] for row in order]
+
+        for row, task in enumerate(self.tasks.values()):
+            task.row = row
+
+        self.rows = len(order)
+        self.dead_rows = 0
+
+    def header_index(self, header: str) -> int:
+        index = self.lookup_cache.get("index")
+        if index is None:
+            index = self.lookup_cache["index"] = {h: i for i, h in enumerate(self.headers)}
+        return index[header]
+
+    def add_column(self, header: str):
+        assert header not in self.headers, f"column named {header} already exists"
+
+        self.headers.append(header)
+        self.columns[header] = [""] * self.rows
+        self.constraints[header] = Constraint.empty(header)
+        self.column_aliases[header] = None
+        self.schema_changed("add", header)
+
+    def move_column(self, header: str, index: int):
+        assert header in self.headers, f"column named {header} does not exist"
+
+        self.headers.remove(header)
+        self.headers.insert(index, header)
+        self.schema_changed("move", header, index)
+
+    def rename_column(self, header: str, name: str):
+        assert header in self.headers, f"column named {header} does not exist"
+        assert name not in self.headers, f"column named {name} already exists"
+
+        self.headers[self.headers.index(header)] = name
+        self.columns[name] = self.columns.pop(header)
+        if header in self.postings:
+            self.postings[name] = self.postings.pop(header)
+        if header in self.sorted_indexes:
+            self.sorted_indexes[name] = self.sorted_indexes.pop(header)
+        self.column_aliases[name] = self.column_aliases.pop(header, header)
+
+        constraint = self.constraints.pop(header, None) or Constraint.empty(header)
+        self.constraints[name] = replace(constraint, HeaderName=name)
+        self.schema_changed("rename", header, name)
+
+    def remove_column(self, header: str):
+        assert header in self.headers, f"column named {header} does not exist"
+
+        self.headers.remove(header)
+        del self.columns[header]
+        self.postings.pop(header, None)
+        self.sorted_indexes.pop(header, None)
+        self.column_aliases.pop(header, None)
+        self.constraints.pop(header, None)
+        self.schema_changed("remove", header)
+
+    def schema_changed(self, *entry: Any):
+        """record a column change, rows read with an older set of headers are
+        reshaped on load instead of rewriting the queue"""
+        self.invalidate()
+        self.record("column", *entry)
+
+    def archive_header(self, header: str) -> Optional[str]:
+        """name of header in the archive segment, None if it has no cells there"""
+        return self.column_aliases.get(header, header)
+
+    def next_id(self) -> int:
+        return self.id_counter + 1
+
     def add_constraint(self, constraint: Constraint) -> Constraint:
         self.constraints[constraint.HeaderName] = constraint
+        self.touch()
         return constraint
 
+    def remove_constraint(self, header: str) -> Optional[Constraint]:
+        constraint = self.constraints.pop(header, None)
+        if constraint is not None:
+            self.touch()
+        return constraint
+
+    def sync_id_counter(self):
+        if self.id_counter:
+            self.config.set_value(consts.CONFIG_ID_COUNTER, str(self.id_counter))
+
+    def touch(self):
+        """mark a change that can only be persisted by rewriting the whole queue,
+        headers or constraints may have changed so cached lookups are dropped"""
+        self.dirty = True
+        self.invalidate()
+
+    def invalidate(self):
+        """drop lookups cached from the headers and constraints"""
+        self.lookup_cache.clear()
+        self.search_index = None
+
+    def record(self, *entry: Any):
+        """record a task level change that can be appended to the journal"""
+        self.journal.append(list(entry))
+
+    def needs_rewrite(self) -> bool:
+        return (
+            self.dirty
+            or self.config.dirty
+            or any(c.dirty for c in self.constraints.values())
+        )
+
+    def is_dirty(self) -> bool:
+        return bool(self.journal) or self.needs_rewrite()
+
+    def mark_clean(self):
+        self.dirty = False
+        self.journal.clear()
+        self.config.dirty = False
+        for constraint in self.constraints.values():
+            constraint.dirty = False
+
     def find(self, id: int) -> Optional[Task]:
-        return next((task for task in self.tasks if int(task.id) == id), None)
+        task = self.tasks.get(int(id))
+        if task is None and not self.archive_loaded:
+            self.load_archive()
+            task = self.tasks.get(int(id))
+        return task
+
+    def load_archive(self):
+        """load the tasks kept in the cold archive segment of the queue file"""
+        if self.archive_loaded:
+            return
+
+        self.archive_loaded = True
+        if self.archive_loader is None:
+            return
+
+        archived = []
+        for task in self.archive_loader(self):
+            if task.id in self.tasks:
+                self.dead_rows += 1
+            else:
+                archived.append(task)
+
+        if not archived:
+            return
+
+        for task in archived:
+            self.load_task(task)
+
+        self.tasks = dict(sorted(self.tasks.items()))
 
     def find_or_fail(self, id: int) -> Task:
         task = self.find(id)
@@ -190,9 +592,12 @@ class TaskQueue:
         if value is None:
             return self.constraints.get(header)
 
-        return next(
-            (c for c in self.constraints.values() if c.__dict__[header] == value), None
-        )
+        key = ("constraint", header, value)
+        if key not in self.lookup_cache:
+            self.lookup_cache[key] = next(
+                (c for c in self.constraints.values() if c.__dict__[header] == value), None
+            )
+        return self.lookup_cache[key]
 
     def find_constraint_or_fail(
         self, header: str, value: Optional[str] = None, msg=None
@@ -208,16 +613,28 @@ class TaskQueue:
         return constraint
 
     def find_constraint_fallback(self, header: str, value: Optional[str] = None) -> Constraint:
-        return self.find_constraint(header, value) or Constraint.empty(header)
+        constraint = self.find_constraint(header, value)
+        if constraint is not None:
+            return constraint
+
+        key = ("fallback", header)
+        if key not in self.lookup_cache:
+            self.lookup_cache[key] = Constraint.empty(header)
+        return self.lookup_cache[key]
+
+    def alter_constraint(self, constraint: Constraint, key: str, value: Any):
+        setattr(constraint, key, value)
+        self.touch()
+
+        if key == "Type":
+            self.decode_column(constraint.HeaderName)
 
     def remove_task(self, id: int) -> Optional[Task]:
-        start_len = len(self.tasks)
-        for idx, task in enumerate(self.tasks):
-            if int(task.id) == id:
-                t = self.tasks.pop(idx)
-                assert len(self.tasks) != start_len
-                return t
-        return None
+        task = self.find(id)
+        if task is not None:
+            self.unload_task(task.id)
+            self.record("remove", task.id)
+        return task
 
     def header_pk(self) -> str:
         return self.find_constraint_or_fail(
@@ -269,14 +686,25 @@ class TaskQueue:
             )
         ]
 
-    def smart_header_match(self, name: str) -> Optional[str]:
-        name = name.lower()
+    def header_lookup_table(self) -> dict[str, str]:
+        """map every lowercased name that smart_header_match accepts to its header,
+        AutoHeader columns also match on any prefix and earlier headers win"""
+        table = self.lookup_cache.get("headers")
+        if table is not None:
+            return table
 
+        table = {}
         for header in self.headers:
-            if name == header.lower():
-                return header
+            lheader = header.lower()
+            table.setdefault(lheader, header)
+
             constraint = self.find_constraint(header)
-            if constraint.AutoHeader and header.lower().startswith(name):
-                return header
+            if constraint and constraint.AutoHeader:
+                for idx in range(len(lheader)):
+                    table.setdefault(lheader[:idx], header)
 
-        return None
+        self.lookup_cache["headers"] = table
+        return table
+
+    def smart_header_match(self, name: str) -> Optional[str]:
+        return self.header_lookup_table().get(name.lower())
@@ -1,16 +1,20 @@
 import globals
-from tabulate import tabulate
 import functools
+import re
 from colorama import Fore
 import os
 import random
 import consts
 import shutil
+import sys
+from typing import Iterator, Optional
 
 
 def get_terminal_size() -> tuple[int, int]:
     if globals.USE_LESS_FOR_OUTPUT:
         return consts.FALLBACK_TERMINAL_SIZE
+    if globals.TERMINAL_SIZE is not None:
+        return globals.TERMINAL_SIZE
     try:
         return os.get_terminal_size()
     except OSError:
@@ -36,74 +40,179 @@ def star_symbol_surround(msg: str, width: int):
     return fmt
 
 
-def find_visual_length_of_line(line: str):
-    line_without_colours = functools.reduce(
-        lambda acc, r: acc.replace(r, ""), Fore.__dict__.values(), line
-    )
-    return len(line_without_colours)
+# any CSI escape sequence, which covers every SGR colour code including the
+# 24-bit ones emitted for #rrggbb colours
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-?]*[ -/]*[@-~]")
 
 
-def pretty_print_table(
-    table,
-    headers=None,
-    column_widths=None,
-    style=None,
-    msg_before=[],
-    msg_after=[],
-    indent_table="",
-):
+def find_visual_length_of_line(line: str) -> int:
+    if "\x1b" not in line:
+        return len(line)
+    return len(ANSI_ESCAPE.sub("", line))
 
-    def truncate_table_width(text: str) -> str:
-        lines = text.split("\n")
 
-        twidth, theight = get_terminal_size()
-        truncated_lines = []
+def truncate_visual(line: str, width: int) -> str:
+    """cut line after width visible characters, escape sequences before the
+    cut are kept and do not count towards the width"""
+    visible, pos = 0, 0
+    for match in ANSI_ESCAPE.finditer(line):
+        text_length = match.start() - pos
+        if visible + text_length >= width:
+            break
 
-        for line in lines:
-            if twidth < find_visual_length_of_line(line):
-                target_idx = twidth
-                target_text = line
-
-                idx = 0
-                visual_idx = 0
-                while visual_idx < target_idx:
-                    for r in Fore.__dict__.values():
-                        if target_text[idx:].startswith(r):
-                            idx += len(r)
-                    visual_idx += 1
-                    idx += 1
-
-                truncated_lines.append(line[:idx])
-            else:
-                truncated_lines.append(line)
+        visible += text_length
+        pos = match.end()
 
-        return "\n".join(truncated_lines)
+    return line[: pos + width - visible]
 
-    def style_txt_process(text: str) -> str:
-        BORDERS = ["─", "┴", "┼", "┬", "├", "│", "┤", "|", "┘", "┐", "┌", "└"]
 
-        match style:
-            case _:
-                lines = text.split("\n")
-                output = []
+GRID_BORDERS = ["─", "┴", "┼", "┬", "├", "│", "┤", "|", "┘", "┐", "┌", "└"]
+GRID_BORDER_PATTERN = re.compile("[" + re.escape("".join(GRID_BORDERS)) + "]")
+
+def colour_border(match: re.Match) -> str:
+    return clr_surround_fore(match[0], Fore.BLACK)
+
+
+# column kinds in the order tabulate generalises them, a column takes the
+# most general kind of its cells
+KIND_BOOL, KIND_INT, KIND_FLOAT, KIND_STR = range(4)
+
+
+def cell_kind(text: str) -> int:
+    if text in ("True", "False"):
+        return KIND_BOOL
+
+    try:
+        int(text)
+        return KIND_INT
+    except ValueError:
+        pass
+
+    try:
+        number = float(text)
+    except ValueError:
+        return KIND_STR
+
+    if number != number or number in (float("inf"), float("-inf")):
+        return KIND_FLOAT if text.lower() in ("inf", "-inf", "nan") else KIND_STR
+    return KIND_FLOAT
+
+
+def grid_layout(
+    table: list[list[str]], headers: Optional[list[str]], column_widths: list[Optional[int]]
+) -> Optional[tuple[list[int], list[bool]]]:
+    """width and right alignment of every column for grid_lines, measured in
+    one pass over the cells
+
+    None if the table needs tabulate: cells that are not strings, span several
+    lines, hold wide characters, exceed their ColWidth or make up a column of
+    decimals tabulate would reformat
+    """
+    ncols = len(headers) if headers else len(table[0]) if table else 0
+    if not ncols or not table:
+        return None
+
+    widths = [find_visual_length_of_line(h) + 2 for h in headers] if headers else [0] * ncols
+    raw_widths = widths[:]
+    kinds = [KIND_BOOL] * ncols
+    caps = list(column_widths or []) + [None] * ncols
+
+    for row in table:
+        if len(row) != ncols:
+            return None
+
+        for idx, cell in enumerate(row):
+            if type(cell) is not str or "\n" in cell:
+                return None
+
+            visible = ANSI_ESCAPE.sub("", cell) if "\x1b" in cell else cell
+            if not visible.isascii():
+                return None
+
+            stripped = cell.strip()
+            width = len(visible) if stripped is cell else find_visual_length_of_line(stripped)
+            if caps[idx] is not None and width > caps[idx]:
+                return None
+
+            if width > widths[idx]:
+                widths[idx] = width
+            if len(visible) > raw_widths[idx]:
+                raw_widths[idx] = len(visible)
+            if kinds[idx] != KIND_STR:
+                kinds[idx] = max(kinds[idx], cell_kind(visible))
+
+    if KIND_FLOAT in kinds:
+        return None
+
+    # tabulate strips left aligned cells but keeps the padding of numbers
+    right = [kind == KIND_INT for kind in kinds]
+    widths = [raw if r else w for w, raw, r in zip(widths, raw_widths, right)]
+    return widths, right
+
+
+def grid_lines(
+    table: list[list[str]], headers: Optional[list[str]], widths: list[int], right: list[bool]
+) -> Iterator[str]:
+    """lines of a simple_grid table with coloured borders, yielded one at a
+    time so large tables are printed while they are rendered"""
+
+    def rule(left: str, middle: str, end: str) -> str:
+        return clr_surround_fore(
+            left + middle.join("─" * (w + 2) for w in widths) + end, Fore.BLACK
+        )
+
+    separator = clr_surround_fore("│", Fore.BLACK)
+    inner = f" {separator} "
+
+    def line(cells: list[str], strip: bool) -> str:
+        padded = []
+        for cell, width, r in zip(cells, widths, right):
+            if strip and not r:
+                cell = cell.strip()
+
+            fill = " " * (width - find_visual_length_of_line(cell))
+            padded.append(fill + cell if r else cell + fill)
+
+        if GRID_BORDER_PATTERN.search("".join(padded)):
+            padded = [GRID_BORDER_PATTERN.sub(colour_border, cell) for cell in padded]
+
+        return f"{separator} {inner.join(padded)} {separator}"
+
+    between = rule("├", "┼", "┤")
+    yield rule("┌", "┬", "┐")
+
+    if headers:
+        yield line(headers, strip=False)
+        yield between
+
+    for idx, row in enumerate(table):
+        if idx:
+            yield between
+        yield line(row, strip=True)
+
+    yield rule("└", "┴", "┘")
 
-                for idx, line in enumerate(lines):
-                    if idx % 2 == 0:
-                        output.append(clr_surround_fore(line, Fore.BLACK))
-                    else:
-                        text = line
-                        for r in BORDERS:
-                            text = text.replace(r, clr_surround_fore(r, Fore.BLACK))
 
-                        output.append(text)
+def tabulate_lines(table, headers, column_widths) -> list[str]:
+    # only imported for the tables grid_lines cannot render
+    from tabulate import tabulate
 
-                return "\n".join(output)
+    def style_txt_process(text: str) -> str:
+        lines = text.split("\n")
+        output = []
+
+        for idx, line in enumerate(lines):
+            if idx % 2 == 0:
+                output.append(clr_surround_fore(line, Fore.BLACK))
+            else:
+                output.append(GRID_BORDER_PATTERN.sub(colour_border, line))
+
+        return output
 
     prettify_fn = tabulate
 
     if headers:
-        headers_clr = [clr_surround_fore(h, Fore.GREEN) for h in headers]
-        prettify_fn = functools.partial(prettify_fn, headers=headers_clr)
+        prettify_fn = functools.partial(prettify_fn, headers=headers)
 
     if not column_widths:
         if headers:
@@ -115,34 +224,64 @@ def pretty_print_table(
         table if table else [[]], tablefmt="simple_grid", maxcolwidths=column_widths
     )
 
-    prettified = style_txt_process(txt)
-    if indent_table:
-        lines = [f"{indent_table} {line}" for line in prettified.split("\n")]
-        prettified = "\n".join(lines)
+    return style_txt_process(txt)
+
+
+def pretty_print_table(
+    table,
+    headers=None,
+    column_widths=None,
+    style=None,
+    msg_before=[],
+    msg_after=[],
+    indent_table="",
+):
+    twidth, theight = get_terminal_size()
+
+    def finish_line(line: str) -> str:
+        if indent_table:
+            line = f"{indent_table} {line}"
 
-    prettified = truncate_table_width(prettified) + Fore.RESET
-    table_visual_width = find_visual_length_of_line(prettified.split("\n")[0])
+        if twidth < len(line) and twidth < find_visual_length_of_line(line):
+            return truncate_visual(line, twidth)
+        return line
 
-    final_text = prettified
+    headers_clr = [clr_surround_fore(h, Fore.GREEN) for h in headers] if headers else None
+
+    layout = grid_layout(table, headers_clr, column_widths)
+    if layout is not None:
+        lines = map(finish_line, grid_lines(table, headers_clr, *layout))
+    else:
+        lines = map(finish_line, tabulate_lines(table, headers_clr, column_widths))
 
+    first = next(lines)
+    table_visual_width = find_visual_length_of_line(first)
+
+    before, after = "", ""
     if not globals.QUIET_OPTION_SET:
-        final_text = (
+        before = (
             "\n".join(
                 star_symbol_surround(msg, table_visual_width) for msg in msg_before
             )
             + "\n"
-            + final_text
         )
-        final_text = (
-            final_text
-            + "\n"
-            + "\n".join(
-                star_symbol_surround(msg, table_visual_width) for msg in msg_after
-            )
+        after = "\n" + "\n".join(
+            star_symbol_surround(msg, table_visual_width) for msg in msg_after
         )
 
     if globals.USE_LESS_FOR_OUTPUT:
+        final_text = before + "\n".join([first, *lines]) + Fore.RESET + after
         assert shutil.which("less"), "'less' could not be found on PATH, ensure that you have it installed before using the --less option"
         os.system(f'echo "{final_text}" | less +gg -SRCQaix4 --tilde')
-    else:
-        print(final_text)
+        return
+
+    write = sys.stdout.write
+    try:
+        write(before + first)
+        for line in lines:
+            write("\n" + line)
+        write(Fore.RESET + after + "\n")
+    except BrokenPipeError:
+        # the reader went away, as in tqb ls | head, but the command still has
+        # to finish and save so the rest of the output goes to devnull
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+import base
+import cmds
+import storage
+import parsing
+
+BATCH_PATH = base.TEST_RES_PATH + "batch.txt"
+
+
+def write_batch(*lines: str):
+    with open(BATCH_PATH, "w") as fp:
+        fp.write("\n".join(lines) + "\n")
+
+
+@base.setup_create_teardown
+def test_batch_saves_once(runner):
+    write_batch(
+        "# comment",
+        'add "first task"',
+        "tqb add second Priority=High",
+        "",
+        '["add", "third"]',
+        '{"argv": ["mark", "1", "Done"]}',
+    )
+
+    serialized = []
+    serialize = parsing.serialize
+    parsing.serialize = lambda path, tq: serialized.append(path) or serialize(path, tq)
+    try:
+        runner(base.argsd("-q", "batch", BATCH_PATH))
+    finally:
+        parsing.serialize = serialize
+
+    assert serialized == [base.TEST_QUEUE_PATH]
+    assert cmds.deferred_saves is None and storage.resident is None
+
+    taskq = storage.deserialize(base.TEST_QUEUE_PATH)
+    assert [t.geti("Task") for t in taskq.tasks.values()] == ["first task", "second", "third"]
+    assert taskq.find(1).geti("Status") == "Done"
+
+
+@base.setup_create_teardown
+def test_batch_stops_at_error(runner):
+    runner(base.argsd("add", "kept"))
+    write_batch("add lost", "show 99", "add never")
+
+    with pytest.raises(AssertionError, match="line 2"):
+        runner(base.argsd("batch", BATCH_PATH))
+
+    assert cmds.deferred_saves is None
+    output = runner(base.argsd("ls", "--ids"), capture=True)
+    assert output == "1"
+
+
+@base.setup_create_teardown
+def test_batch_every_and_report(runner):
+    write_batch("add first", "add second", "show 99")
+
+    with pytest.raises(AssertionError):
+        runner(base.argsd("-q", "batch", "--every", "1", BATCH_PATH))
+
+    output = runner(base.argsd("ls", "--ids"), capture=True)
+    assert output == "2 1"
+
+    write_batch("ls --ids", "show 99")
+    with base.StdoutCapture() as output, pytest.raises(AssertionError):
+        runner(base.argsd("batch", "--report", BATCH_PATH))
+
+    reports = [json.loads(line) for line in output]
+    assert [r["line"] for r in reports] == [1, 2]
+    assert reports[0]["status"] == 0 and reports[0]["stdout"].strip() == "2 1"
+    assert reports[1]["status"] == 1 and "could not find task" in reports[1]["stderr"]
+
+
+@base.setup_create_teardown
+def test_batch_rejects_bad_json(runner):
+    write_batch('["add", 1]')
+
+    with pytest.raises(AssertionError, match="line 1"):
+        runner(base.argsd("batch", "--format", "jsonl", BATCH_PATH))
+
+    write_batch("add first", '{"argv": ["add", "second"]}')
+    with pytest.raises(AssertionError, match="line 2"):
+        runner(base.argsd("batch", "--format", "lines", BATCH_PATH))
@@ -72,6 +72,18 @@ def test_cmd_update_fail(runner):
         runner(argsd("update", "1001", "task", "test2"))
 
 
+@setup_create_teardown
+def test_cmd_update_id_fail(runner):
+    runner(argsd("add", "first"))
+    with pytest.raises(AssertionError, match="Id column"):
+        runner(argsd("update", "1", "Id", "4"))
+
+    runner(argsd("add", "second"))
+    runner(argsd("compact"))
+    output = runner(argsd("ls", "--ids"), capture=True)
+    assert output == "2 1"
+
+
 @setup_create_teardown
 def test_cmd_mark(runner):
     runner(argsd("add", "test", "Status=Not Started"))
@@ -129,3 +141,72 @@ def test_cmd_archive_fail(runner):
 
     with pytest.raises(AssertionError):
         runner(argsd("archive", "1002"))
+
+
+@setup_create_teardown
+def test_cmd_add_id_not_reused(runner):
+    runner(argsd("add", "first"))
+    runner(argsd("add", "second"))
+    runner(argsd("remove", "2"))
+    runner(argsd("add", "third"))
+
+    output = runner(argsd("ls", "--ids"), capture=True)
+    assert output == "3 1"
+
+
+@setup_create_teardown
+def test_cmd_column_add_rename_remove(runner):
+    runner(argsd("add", "first"))
+    runner(argsd("column", "add", "Owner"))
+    runner(argsd("update", "1", "Owner", "me"))
+    runner(argsd("column", "rename", "Owner", "Assignee"))
+
+    output = runner(argsd("ls", "--ids", "--where", "Assignee=me"), capture=True)
+    assert output == "1"
+
+    runner(argsd("column", "remove", "Assignee"))
+    with pytest.raises(AssertionError):
+        runner(argsd("ls", "--where", "Assignee=me"))
+
+
+@setup_create_teardown
+def test_cmd_alias_loads_and_saves_once(runner):
+    import parsing
+
+    runner(argsd("add", "first"))
+    runner(argsd("config", "add", "Alias", "start", "mark $0 i; update $0 Priority h ;ls --ids"))
+
+    calls = []
+    deserialize, serialize = parsing.deserialize, parsing.serialize
+    parsing.deserialize = lambda *args: calls.append("load") or deserialize(*args)
+    parsing.serialize = lambda *args: calls.append("save") or serialize(*args)
+    try:
+        output = runner(argsd("-q", "alias", "start", "1"), capture=True)
+    finally:
+        parsing.deserialize, parsing.serialize = deserialize, serialize
+
+    assert calls == ["load", "save"]
+    assert output == "1"
+
+    output = runner(argsd("ls", "--ids", "--where", "status=i", "priority=h"), capture=True)
+    assert output == "1"
+
+
+@setup_create_teardown
+def test_cmd_alias_fail(runner):
+    runner(argsd("add", "first"))
+    runner(argsd("config", "add", "Alias", "broken", "mark 1 d; show 99"))
+    runner(argsd("config", "add", "Alias", "loop", "ls; alias loop"))
+
+    with pytest.raises(AssertionError):
+        runner(argsd("alias", "missing"))
+
+    with pytest.raises(AssertionError):
+        runner(argsd("alias", "loop"))
+
+    # the first command ran but its change is not saved
+    with pytest.raises(AssertionError):
+        runner(argsd("alias", "broken"))
+
+    output = runner(argsd("ls", "--ids", "--where", "status=d"), capture=True)
+    assert output == ""
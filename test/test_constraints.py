@@ -0,0 +1,29 @@
+import pytest
+from colorama import Fore
+
+import base
+from constraints import Constraint
+
+
+def test_colour_rules_first_match_wins():
+    constraint = Constraint.kwargs(HeaderName="Sprint", Colours="h1*=RED|h1 jan=BLUE|*=GREEN")
+    assert constraint.apply_colour("H1 Jan") == Fore.RED + "H1 Jan" + Fore.RESET
+    assert constraint.apply_colour("H2 Jan") == Fore.GREEN + "H2 Jan" + Fore.RESET
+
+    constraint.Colours = "h1 jan=BLUE|h1*=RED"
+    assert constraint.apply_colour("H1 Jan") == Fore.BLUE + "H1 Jan" + Fore.RESET
+    assert constraint.apply_colour("H1 Feb") == Fore.RED + "H1 Feb" + Fore.RESET
+    assert constraint.apply_colour("H2 Feb") == "H2 Feb"
+
+
+def test_variant_autofill_prefers_earlier_variants():
+    constraint = Constraint.kwargs(HeaderName="Status", Variant="Not Started|In Progress|Done")
+    assert constraint.constrain_variant("done") == "Done"
+    with pytest.raises(AssertionError):
+        constraint.constrain_variant("d")
+
+    constraint.Autofill = True
+    assert constraint.constrain_variant("d") == "Done"
+    assert constraint.constrain_variant("") == ""
+    with pytest.raises(AssertionError):
+        constraint.constrain_variant("x")
@@ -0,0 +1,107 @@
+import os
+
+import base
+import consts
+import daemon
+import storage
+from main import program_argument_parser
+
+
+def handle(*args: str) -> tuple[int, str, str]:
+    request = daemon.encode_request(list(args), os.getcwd(), "")
+    status, stdout, stderr, _ = daemon.handle(program_argument_parser(), request)
+    return status, stdout, stderr
+
+
+def resident(func):
+    def inner(runner):
+        storage.resident = storage.ResidentQueues()
+        try:
+            func(runner)
+        finally:
+            storage.resident = None
+
+    return inner
+
+
+def test_request_round_trip():
+    data = daemon.encode_request(["ls", "--where", "task=a b"], "/tmp", "80x24")
+    assert daemon.decode_request(data) == ("/tmp", "80x24", ["ls", "--where", "task=a b"])
+
+
+def test_forward_without_daemon_runs_locally():
+    os.environ[consts.DAEMON_SOCKET_ENV] = os.path.join(base.TEST_RES_PATH, "missing.sock")
+    try:
+        assert daemon.forward(["ls"]) is None
+    finally:
+        del os.environ[consts.DAEMON_SOCKET_ENV]
+
+
+def test_socket_in_private_dir():
+    env = {k: os.environ.pop(k) for k in ("XDG_RUNTIME_DIR", consts.DAEMON_SOCKET_ENV) if k in os.environ}
+    try:
+        path = daemon.socket_path()
+    finally:
+        os.environ.update(env)
+
+    assert path == f"/tmp/tqb-{os.getuid()}/{consts.DAEMON_SOCKET_NAME}"
+
+
+@base.setup_teardown
+def test_private_dir_and_peer_checks(runner):
+    import socket
+
+    directory = os.path.join(base.TEST_RES_PATH, "sock")
+    os.mkdir(directory, 0o700)
+    assert daemon.private_dir(directory)
+
+    os.chmod(directory, 0o750)
+    assert not daemon.private_dir(directory)
+
+    os.symlink(os.path.abspath(directory), directory + "-link")
+    os.chmod(directory, 0o700)
+    assert not daemon.private_dir(directory + "-link")
+
+    left, right = socket.socketpair(socket.AF_UNIX)
+    with left, right:
+        assert daemon.peer_is_self(left, directory)
+
+
+@base.setup_create_teardown
+@resident
+def test_handle_keeps_queue_resident(runner):
+    status, stdout, _ = handle(*base.argsd("add", "first"))
+    assert status == 0
+    assert "\x1b[" not in stdout
+
+    tq = storage.resident.get(base.TEST_QUEUE_PATH)
+    assert tq is not None and len(tq.tasks) == 1
+
+    status, stdout, _ = handle(*base.argsd("ls"))
+    assert status == 0 and "first" in stdout
+    assert storage.resident.get(base.TEST_QUEUE_PATH) is tq
+
+
+@base.setup_create_teardown
+@resident
+def test_handle_reloads_changed_queue(runner):
+    handle(*base.argsd("add", "first"))
+
+    # written by a tqb process that bypassed the daemon
+    queues, storage.resident = storage.resident, None
+    runner(base.argsd("add", "second"))
+    storage.resident = queues
+
+    _, stdout, _ = handle(*base.argsd("ls"))
+    assert "first" in stdout and "second" in stdout
+
+
+@base.setup_create_teardown
+@resident
+def test_handle_reports_errors(runner):
+    status, _, stderr = handle(*base.argsd("show", "99"))
+    assert status == 2
+    assert "could not find task" in stderr
+
+    status, _, _ = handle(*base.argsd("--less", "ls"))
+    assert status == consts.DAEMON_RUN_LOCALLY
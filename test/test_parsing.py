@@ -0,0 +1,414 @@
+import os
+
+import pytest
+
+from base import (
+    argsd,
+    setup_create_teardown,
+    TEST_QUEUE_PATH,
+)
+
+import consts
+import parsing
+import journal
+
+
+@setup_create_teardown
+def test_snapshot_written_when_enabled(runner):
+    runner(argsd("add", "test"))
+    assert not os.path.exists(parsing.snapshot_path(TEST_QUEUE_PATH))
+
+    runner(argsd("config", "add", consts.CONFIG_SNAPSHOT_CACHE, "True"))
+    assert os.path.exists(parsing.snapshot_path(TEST_QUEUE_PATH))
+
+    snapshot = parsing.load_snapshot(TEST_QUEUE_PATH)
+    assert snapshot is not None
+    assert list(snapshot[0].tasks) == [1]
+
+
+@setup_create_teardown
+def test_snapshot_stale_after_csv_edit(runner):
+    runner(argsd("config", "add", consts.CONFIG_SNAPSHOT_CACHE, "True"))
+    runner(argsd("add", "test"))
+    runner(argsd("compact"))
+
+    with open(TEST_QUEUE_PATH, "a", encoding="utf-8") as fp:
+        fp.write("2,edited by hand,Not Started,Low,False\n")
+
+    assert parsing.load_snapshot(TEST_QUEUE_PATH) is None
+
+    output = runner(argsd("ls", "--ids"), capture=True)
+    assert output == "2 1"
+    taskq, _ = parsing.load_snapshot(TEST_QUEUE_PATH)
+    assert list(taskq.tasks) == [1, 2]
+
+
+@setup_create_teardown
+def test_snapshot_removed_when_disabled(runner):
+    runner(argsd("config", "add", consts.CONFIG_SNAPSHOT_CACHE, "True"))
+    assert os.path.exists(parsing.snapshot_path(TEST_QUEUE_PATH))
+
+    runner(argsd("config", "remove", consts.CONFIG_SNAPSHOT_CACHE, "True"))
+    assert not os.path.exists(parsing.snapshot_path(TEST_QUEUE_PATH))
+
+
+class PlantedPayload:
+    def __reduce__(self):
+        return (open, (TEST_QUEUE_PATH + ".pwned", "w"))
+
+
+@setup_create_teardown
+def test_snapshot_never_unpickled(runner):
+    import pickle
+
+    runner(argsd("add", "test"))
+    with open(parsing.snapshot_path(TEST_QUEUE_PATH), "wb") as fp:
+        pickle.dump(PlantedPayload(), fp)
+
+    # ignored unless enabled, and never decoded as a pickle once it is
+    output = runner(argsd("ls", "--ids"), capture=True)
+    assert output == "1"
+
+    runner(argsd("config", "add", consts.CONFIG_SNAPSHOT_CACHE, "True"))
+    with open(parsing.snapshot_path(TEST_QUEUE_PATH), "wb") as fp:
+        pickle.dump(PlantedPayload(), fp)
+
+    output = runner(argsd("ls", "--ids"), capture=True)
+    assert output == "1"
+    assert not os.path.exists(TEST_QUEUE_PATH + ".pwned")
+
+
+@setup_create_teardown
+def test_snapshot_owner_checked(runner):
+    runner(argsd("config", "add", consts.CONFIG_SNAPSHOT_CACHE, "True"))
+    runner(argsd("add", "test"))
+    runner(argsd("compact"))
+    spath = parsing.snapshot_path(TEST_QUEUE_PATH)
+    assert parsing.load_snapshot(TEST_QUEUE_PATH) is not None
+
+    os.chmod(spath, 0o666)
+    assert parsing.load_snapshot(TEST_QUEUE_PATH) is None
+    os.chmod(spath, 0o600)
+
+
+@setup_create_teardown
+def test_stale_snapshot_formats_ignored(runner):
+    import marshal
+
+    runner(argsd("config", "add", consts.CONFIG_SNAPSHOT_CACHE, "True"))
+    runner(argsd("add", "test"))
+    runner(argsd("compact"))
+    spath = parsing.snapshot_path(TEST_QUEUE_PATH)
+
+    with open(spath, "rb") as fp:
+        data = fp.read()[len(parsing.snapshot_magic()) :]
+
+    # an older version, a truncated payload and a payload of the wrong shape
+    for written in (
+        b"tqbsnap 1\n" + data,
+        parsing.snapshot_magic() + data[:-10],
+        parsing.snapshot_magic() + marshal.dumps((1, 2, (3,))),
+    ):
+        with open(spath, "wb") as fp:
+            fp.write(written)
+        assert parsing.load_snapshot(TEST_QUEUE_PATH) is None
+
+        output = runner(argsd("ls", "--ids"), capture=True)
+        assert output == "1"
+        assert parsing.load_snapshot(TEST_QUEUE_PATH) is not None
+
+
+@setup_create_teardown
+def test_snapshot_keeps_typed_cells(runner):
+    import datetime
+
+    runner(argsd("config", "add", consts.CONFIG_SNAPSHOT_CACHE, "True"))
+    runner(argsd("add", "first"))
+    runner(argsd("add", "second"))
+    runner(argsd("column", "add", "Due"))
+    runner(argsd("update", "1", "Due", "2024-01-15"))
+    runner(argsd("constraint", "update", "Due", "Type", "date"))
+    runner(argsd("compact"))
+
+    taskq, _ = parsing.load_snapshot(TEST_QUEUE_PATH)
+    assert taskq.find(1).geti("due") == datetime.date(2024, 1, 15)
+    assert taskq.find(2).geti("due") == ""
+    assert taskq.find(2).geti("id") == 2
+    assert taskq.sorted_index("Due").keys == [datetime.date(2024, 1, 15)]
+
+
+@setup_create_teardown
+def test_read_only_commands_do_not_write(runner):
+    runner(argsd("add", "test"))
+    before = os.stat(TEST_QUEUE_PATH).st_mtime_ns
+
+    runner(argsd("ls"), capture=True)
+    runner(argsd("show", "1"), capture=True)
+    runner(argsd("config", "ls"), capture=True)
+    runner(argsd("constraint", "ls"), capture=True)
+
+    assert os.stat(TEST_QUEUE_PATH).st_mtime_ns == before
+
+
+@setup_create_teardown
+def test_mutating_commands_write(runner):
+    before = os.stat(TEST_QUEUE_PATH).st_mtime_ns
+    runner(argsd("constraint", "update", "Task", "ColWidth", "20"))
+    after = os.stat(TEST_QUEUE_PATH).st_mtime_ns
+    assert after != before
+
+    taskq = parsing.deserialize(TEST_QUEUE_PATH)
+    assert taskq.find_constraint("Task").ColWidth == 20
+    assert not taskq.is_dirty()
+
+
+def read_queue_file():
+    with open(TEST_QUEUE_PATH, encoding="utf-8") as fp:
+        return fp.read()
+
+
+@setup_create_teardown
+def test_task_changes_are_journaled(runner):
+    before = read_queue_file()
+
+    runner(argsd("add", "first"))
+    runner(argsd("add", "second"))
+    runner(argsd("mark", "1", "Done"))
+    runner(argsd("remove", "2"))
+
+    assert read_queue_file() == before
+    assert os.path.exists(journal.journal_path(TEST_QUEUE_PATH))
+
+    taskq = parsing.deserialize(TEST_QUEUE_PATH)
+    assert list(taskq.tasks) == [1]
+    assert taskq.find(1).geti("Status") == "Done"
+    assert taskq.next_id() == 3
+
+    runner(argsd("compact"))
+    assert not os.path.exists(journal.journal_path(TEST_QUEUE_PATH))
+
+    compacted = parsing.deserialize(TEST_QUEUE_PATH)
+    assert [t.serialize() for t in compacted.tasks.values()] == [
+        t.serialize() for t in taskq.tasks.values()
+    ]
+    assert compacted.next_id() == 3
+
+
+@setup_create_teardown
+def test_journal_torn_tail_is_ignored(runner):
+    runner(argsd("add", "first"))
+
+    with open(journal.journal_path(TEST_QUEUE_PATH), "ab") as fp:
+        fp.write(b'[["set", 1, "Task", "torn')
+
+    runner(argsd("add", "second"))
+    taskq = parsing.deserialize(TEST_QUEUE_PATH)
+    assert taskq.find(1).geti("Task") == "first"
+    assert list(taskq.tasks) == [1, 2]
+
+
+@setup_create_teardown
+def test_journal_compacts_past_max_size(runner):
+    runner(argsd("config", "add", consts.CONFIG_JOURNAL_MAX_SIZE, "0"))
+    runner(argsd("add", "first"))
+
+    assert not os.path.exists(journal.journal_path(TEST_QUEUE_PATH))
+    assert "first" in read_queue_file()
+
+
+@setup_create_teardown
+def test_journal_max_size_must_be_a_number(runner):
+    runner(argsd("add", "first"))
+    runner(argsd("config", "add", consts.CONFIG_JOURNAL_MAX_SIZE, "big"))
+
+    with pytest.raises(AssertionError, match=consts.CONFIG_JOURNAL_MAX_SIZE):
+        runner(argsd("add", "second"))
+
+    runner(argsd("config", "remove", consts.CONFIG_JOURNAL_MAX_SIZE, "big"))
+    runner(argsd("add", "second"))
+    assert list(parsing.deserialize(TEST_QUEUE_PATH).tasks) == [1, 2]
+
+
+@setup_create_teardown
+def test_id_counter_must_be_a_number(runner):
+    runner(argsd("add", "first"))
+    runner(argsd("compact"))
+
+    text = read_queue_file()
+    assert f"{consts.CONFIG_ID_COUNTER},1," in text
+    with open(TEST_QUEUE_PATH, "w", encoding="utf-8") as fp:
+        fp.write(text.replace(f"{consts.CONFIG_ID_COUNTER},1,", f"{consts.CONFIG_ID_COUNTER},one,"))
+
+    with pytest.raises(AssertionError, match=consts.CONFIG_ID_COUNTER):
+        runner(argsd("ls"), capture=True)
+
+
+@setup_create_teardown
+def test_header_only_commands_skip_task_rows(runner):
+    runner(argsd("add", "test"))
+    runner(argsd("compact"))
+
+    index = parsing.load_index(TEST_QUEUE_PATH)
+    assert index is not None
+    with open(TEST_QUEUE_PATH, "rb") as fp:
+        fp.seek(index["headers"])
+        assert fp.readline().startswith(b"Id,Task")
+        assert fp.readline().startswith(b"1,test")
+
+    with open(TEST_QUEUE_PATH, "a", encoding="utf-8") as fp:
+        fp.write("not a task row\n")
+
+    assert parsing.load_index(TEST_QUEUE_PATH) is None
+    assert "Id,Task" in parsing.read_header_text(TEST_QUEUE_PATH)
+
+    runner(argsd("config", "ls"), capture=True)
+    runner(argsd("constraint", "ls"), capture=True)
+    runner(argsd("constraint", "blueprint"), capture=True)
+
+
+@setup_create_teardown
+def test_header_text_matches_with_and_without_index(runner):
+    indexed = parsing.read_header_text(TEST_QUEUE_PATH)
+    os.remove(parsing.index_path(TEST_QUEUE_PATH))
+    assert parsing.read_header_text(TEST_QUEUE_PATH) == indexed
+
+    taskq = parsing.deserialize_header(TEST_QUEUE_PATH)
+    assert taskq.headers == parsing.deserialize(TEST_QUEUE_PATH).headers
+    assert not taskq.tasks
+
+
+@setup_create_teardown
+def test_archived_tasks_move_to_archive_segment(runner):
+    runner(argsd("add", "first"))
+    runner(argsd("add", "second"))
+    runner(argsd("add", "third"))
+    runner(argsd("archive", "1", "2"))
+    runner(argsd("compact"))
+
+    assert "first" not in read_queue_file()
+    with open(parsing.archive_path(TEST_QUEUE_PATH), encoding="utf-8") as fp:
+        assert "first" in fp.read()
+
+    taskq = parsing.deserialize(TEST_QUEUE_PATH)
+    assert list(taskq.tasks) == [3]
+    assert not taskq.archive_loaded
+
+    assert runner(argsd("ls", "--ids"), capture=True) == "3"
+    assert runner(argsd("ls", "--ids", "--all"), capture=True) == "3 2 1"
+
+    runner(argsd("archive", "1", "--unarchive"))
+    runner(argsd("compact"))
+    assert runner(argsd("ls", "--ids"), capture=True) == "3 1"
+
+    runner(argsd("remove", "2"))
+    runner(argsd("compact"))
+    assert not os.path.exists(parsing.archive_path(TEST_QUEUE_PATH))
+    assert runner(argsd("ls", "--ids", "--all"), capture=True) == "3 1"
+
+
+@setup_create_teardown
+def test_archive_segment_is_appended_without_loading(runner):
+    runner(argsd("add", "first"))
+    runner(argsd("add", "second"))
+    runner(argsd("archive", "1"))
+    runner(argsd("compact"))
+
+    runner(argsd("archive", "2"))
+    runner(argsd("compact"))
+
+    taskq = parsing.deserialize(TEST_QUEUE_PATH)
+    assert not taskq.tasks
+    taskq.load_archive()
+    assert list(taskq.tasks) == [1, 2]
+
+
+@setup_create_teardown
+def test_snapshot_drops_removed_rows(runner):
+    runner(argsd("config", "add", consts.CONFIG_SNAPSHOT_CACHE, "True"))
+    runner(argsd("add", "first"))
+    runner(argsd("add", "second"))
+    runner(argsd("remove", "1"))
+    runner(argsd("compact"))
+
+    taskq, _ = parsing.load_snapshot(TEST_QUEUE_PATH)
+    assert taskq.rows == 1
+    assert taskq.find(2).geti("task") == "second"
+
+
+@setup_create_teardown
+def test_snapshot_keeps_rows_of_unarchived_tasks(runner):
+    runner(argsd("add", "first"))
+    runner(argsd("add", "second"))
+    runner(argsd("archive", "1"))
+    runner(argsd("compact"))
+    runner(argsd("archive", "-u", "1"))
+    runner(argsd("config", "add", consts.CONFIG_SNAPSHOT_CACHE, "True"))
+
+    taskq, _ = parsing.load_snapshot(TEST_QUEUE_PATH)
+    assert [t.geti("task") for t in taskq.tasks.values()] == ["first", "second"]
+
+    runner(argsd("update", "1", "Task", "changed"))
+    runner(argsd("compact"))
+    assert runner(argsd("ls", "--ids", "--where", "Task=second"), capture=True) == "2"
+
+    taskq = parsing.deserialize(TEST_QUEUE_PATH)
+    assert taskq.find(1).geti("task") == "changed"
+    assert taskq.find(2).geti("task") == "second"
+
+
+@setup_create_teardown
+def test_column_changes_are_journaled(runner):
+    runner(argsd("add", "first"))
+    runner(argsd("compact"))
+    before = read_queue_file()
+
+    runner(argsd("column", "add", "Owner"))
+    runner(argsd("column", "move", "Owner", "1"))
+    runner(argsd("update", "1", "Owner", "me"))
+    runner(argsd("column", "rename", "Priority", "Urgency"))
+    runner(argsd("column", "remove", "Status"))
+    assert read_queue_file() == before
+
+    taskq = parsing.deserialize_header(TEST_QUEUE_PATH)
+    assert taskq.headers == ["Id", "Owner", "Task", "Urgency", "Archived"]
+    assert taskq.find_constraint("Urgency").Variant == "High|Medium|Low"
+
+    taskq = parsing.deserialize(TEST_QUEUE_PATH)
+    assert taskq.find(1).serialize() == [1, "me", "first", "Low", False]
+
+    runner(argsd("compact"))
+    assert parsing.deserialize(TEST_QUEUE_PATH) == taskq
+
+
+@setup_create_teardown
+def test_blueprint_includes_journaled_columns(runner):
+    runner(argsd("add", "first"))
+    runner(argsd("compact"))
+    compacted = runner(argsd("constraint", "blueprint"), capture=True)
+
+    runner(argsd("column", "add", "Owner"))
+    journaled = runner(argsd("constraint", "blueprint"), capture=True)
+    assert "Owner" not in compacted
+    assert journaled.splitlines()[-1].split(",") == ["Id", "Task", "Status", "Priority", "Archived", "Owner"]
+
+    runner(argsd("compact"))
+    assert runner(argsd("constraint", "blueprint"), capture=True).split() == journaled.split()
+
+
+@setup_create_teardown
+def test_archive_segment_follows_column_changes(runner):
+    runner(argsd("add", "first"))
+    runner(argsd("add", "second"))
+    runner(argsd("archive", "1"))
+    runner(argsd("compact"))
+
+    runner(argsd("column", "rename", "Task", "Title"))
+    runner(argsd("column", "add", "Priority2"))
+    runner(argsd("archive", "2"))
+    runner(argsd("compact"))
+
+    taskq = parsing.deserialize(TEST_QUEUE_PATH)
+    taskq.load_archive()
+    assert taskq.find(1).geti("Title") == "first"
+    assert taskq.find(2).geti("Title") == "second"
+    assert taskq.find(1).geti("Priority2") == ""
@@ -0,0 +1,279 @@
+import pytest
+
+import base
+import query
+
+
+def test_take_truncates_and_peeks():
+    page, truncated, total = query.take(iter(range(10)), limit=3)
+    assert page == [0, 1, 2]
+    assert truncated
+    assert total is None
+
+
+def test_take_counts_when_asked():
+    page, truncated, total = query.take(iter(range(10)), limit=3, count=True)
+    assert page == [0, 1, 2]
+    assert truncated
+    assert total == 10
+
+
+def test_take_short_stream_is_not_truncated():
+    page, truncated, total = query.take(iter(range(2)), limit=3)
+    assert page == [0, 1]
+    assert not truncated
+    assert total == 2
+
+
+def test_take_sorted_top_k():
+    page, truncated, total = query.take(iter([5, 1, 4, 2, 3]), limit=2, key=lambda x: x)
+    assert page == [1, 2]
+    assert truncated
+    assert total == 5
+
+    page, _, _ = query.take(iter([5, 1, 4, 2, 3]), limit=2, key=query.Descending)
+    assert page == [5, 4]
+
+
+@base.setup_create_teardown
+def test_compile_filter_matches_matchi(runner):
+    runner(base.argsd("add", "write docs", "Priority=High"))
+    runner(base.argsd("add", "fix BUG", "Priority=Low", "Status=Done"))
+
+    output = runner(base.argsd("ls", "--ids", "--where", "prio=h"), capture=True)
+    assert output == "1"
+
+    output = runner(base.argsd("ls", "--ids", "--whereor", "status=d", "prio=h"), capture=True)
+    assert output == "2 1"
+
+    output = runner(base.argsd("ls", "--ids", "--search", "bug"), capture=True)
+    assert output == "2"
+
+    output = runner(base.argsd("ls", "--ids", "--where", "task=*docs"), capture=True)
+    assert output == "1"
+
+
+@base.setup_create_teardown
+def test_header_lookup_cache_invalidated(runner):
+    import storage
+
+    taskq = storage.deserialize(base.TEST_QUEUE_PATH)
+    assert taskq.smart_header_match("prio") == "Priority"
+    assert taskq.header_pk() == taskq.smart_header_match("id")
+
+    constraint = taskq.find_constraint("Priority")
+    taskq.alter_constraint(constraint, "AutoHeader", False)
+    assert taskq.smart_header_match("prio") is None
+    assert taskq.smart_header_match("PRIORITY") == "Priority"
+
+    taskq.headers.append("Prioritised")
+    taskq.add_constraint(taskq.find_constraint_fallback("Prioritised"))
+    taskq.alter_constraint(taskq.find_constraint("Prioritised"), "AutoHeader", True)
+    assert taskq.smart_header_match("prio") == "Prioritised"
+
+
+@base.setup_create_teardown
+def test_typed_columns_decoded_once(runner):
+    import datetime
+    import storage
+
+    for idx in range(10):
+        runner(base.argsd("add", f"task {idx}"))
+
+    output = runner(base.argsd("ls", "--ids", "--notruncate", "--sort", "id"), capture=True)
+    assert output == "1 2 3 4 5 6 7 8 9 10"
+
+    runner(base.argsd("column", "add", "Due"))
+    runner(base.argsd("update", "2", "Due", "2024-03-01"))
+    runner(base.argsd("constraint", "update", "Due", "Type", "date"))
+    runner(base.argsd("update", "1", "Due", "2024-01-15"))
+
+    taskq = storage.deserialize(base.TEST_QUEUE_PATH)
+    assert taskq.find(1).geti("due") == datetime.date(2024, 1, 15)
+    assert taskq.find(2).geti("due") == datetime.date(2024, 3, 1)
+    assert taskq.find(3).geti("due") == ""
+    assert taskq.find(3).is_archived() is False
+
+    output = runner(base.argsd("ls", "--ids", "--notruncate", "--sort", "due"), capture=True)
+    assert output.split()[:2] == ["1", "2"]
+
+
+@base.setup_create_teardown
+def test_variant_postings_narrow_where(runner):
+    import consts
+    import storage
+
+    runner(base.argsd("config", "add", consts.CONFIG_SNAPSHOT_CACHE, "True"))
+    runner(base.argsd("add", "first", "Priority=High"))
+    runner(base.argsd("add", "second", "Status=Done"))
+    runner(base.argsd("add", "third", "Status=Done", "Priority=High"))
+    runner(base.argsd("compact"))
+
+    runner(base.argsd("update", "1", "Status", "Done"))
+    runner(base.argsd("remove", "3"))
+
+    taskq = storage.deserialize(base.TEST_QUEUE_PATH)
+    assert "Status" in taskq.postings
+    assert query.candidate_ids(taskq, ["status=done"]) == {1, 2}
+    assert query.candidate_ids(taskq, ["status=done"], ["prio=h", "prio=m"]) == {1}
+    assert query.candidate_ids(taskq, ["task=first"]) is None
+
+    taskq.find(2).update_column("Priority", "High")
+    assert query.candidate_ids(taskq, ["priority=high"]) == {1, 2}
+
+    output = runner(base.argsd("ls", "--ids", "--where", "status=d", "prio=h"), capture=True)
+    assert output == "1"
+
+
+@base.setup_create_teardown
+def test_postings_only_used_once_built(runner):
+    import storage
+
+    runner(base.argsd("add", "first", "Status=Done"))
+    runner(base.argsd("add", "second"))
+
+    # a one-shot load scans instead of building posting lists
+    taskq = storage.deserialize(base.TEST_QUEUE_PATH)
+    assert query.candidate_ids(taskq, ["status=done"]) is None
+    assert not taskq.postings
+
+    storage.resident = storage.ResidentQueues()
+    try:
+        taskq = storage.deserialize(base.TEST_QUEUE_PATH)
+        assert query.candidate_ids(taskq, ["status=done"]) == {1}
+        assert "Status" in taskq.postings
+    finally:
+        storage.resident = None
+
+
+@base.setup_create_teardown
+def test_sorted_index_only_used_once_built(runner):
+    import storage
+
+    for idx in range(5):
+        runner(base.argsd("add", f"task {idx}"))
+
+    taskq = storage.deserialize(base.TEST_QUEUE_PATH)
+    assert query.candidate_ids(taskq, ["id>3"]) is None
+    assert not taskq.sorted_indexes
+
+    output = runner(base.argsd("ls", "--ids", "--where", "id>3"), capture=True)
+    assert output == "5 4"
+
+    taskq.sorted_index("Id")
+    assert query.candidate_ids(taskq, ["id>3"]) == {4, 5}
+
+
+@base.setup_create_teardown
+def test_search_index_ranks_matches(runner):
+    import consts
+    import storage
+
+    runner(base.argsd("add", "rewrite parser"))
+    runner(base.argsd("add", "parse dates"))
+    runner(base.argsd("add", "parse"))
+    runner(base.argsd("add", "unrelated", "Status=Done"))
+
+    output = runner(base.argsd("ls", "--ids", "--search", "parse"), capture=True)
+    assert output == "3 2 1"
+
+    runner(base.argsd("config", "add", consts.CONFIG_SNAPSHOT_CACHE, "True"))
+    runner(base.argsd("update", "2", "Task", "parse dates again"))
+    runner(base.argsd("remove", "3"))
+
+    taskq = storage.deserialize(base.TEST_QUEUE_PATH)
+    assert taskq.search_index is not None
+    assert query.search_scores(taskq, "parse") == {2: 3, 1: 2}
+    assert query.candidate_ids(taskq, search="done") == {4}
+    assert query.candidate_ids(taskq, search="again") == {2}
+
+    output = runner(base.argsd("ls", "--ids", "--search", "parse"), capture=True)
+    assert output == "2 1"
+    output = runner(base.argsd("ls", "--ids", "--search", "ars*ates"), capture=True)
+    assert output == "2"
+
+
+@base.setup_create_teardown
+def test_comparison_and_range_clauses(runner):
+    import storage
+
+    for idx in range(12):
+        runner(base.argsd("add", f"task {idx}"))
+
+    def ls(*clauses):
+        return runner(base.argsd("ls", "--ids", "--notruncate", "--where", *clauses), capture=True)
+
+    assert ls("id>9") == "12 11 10"
+    assert ls("id>=9", "id<11") == "10 9"
+    assert ls("id=3..5") == "5 4 3"
+    assert ls("id=..2") == "2 1"
+    assert ls("id<=2", "task!=*1") == "1"
+
+    with pytest.raises(AssertionError):
+        ls("task>a")
+
+    runner(base.argsd("column", "add", "Due"))
+    runner(base.argsd("constraint", "update", "Due", "Type", "date"))
+    runner(base.argsd("update", "1", "Due", "2024-01-15"))
+    runner(base.argsd("update", "2", "Due", "2024-02-15"))
+    runner(base.argsd("update", "3", "Due", "2024-03-15"))
+    assert ls("due=2024-02-01..2024-03-31") == "3 2"
+
+    taskq = storage.deserialize(base.TEST_QUEUE_PATH)
+    taskq.sorted_index("Due")
+    assert query.candidate_ids(taskq, ["due>2024-02-15"]) == {3}
+    taskq.find(1).update_column("Due", "2024-12-24")
+    assert query.candidate_ids(taskq, ["due>2024-02-15"]) == {1, 3}
+
+
+@base.setup_create_teardown
+def test_multi_key_sort(runner):
+    runner(base.argsd("add", "a", "Priority=Low"))
+    runner(base.argsd("add", "b", "Priority=High"))
+    runner(base.argsd("add", "c", "Priority=Medium", "Status=Done"))
+    runner(base.argsd("add", "d", "Priority=High", "Status=Done"))
+
+    def ls(*args):
+        return runner(base.argsd("ls", "--ids", "--notruncate", *args), capture=True)
+
+    assert ls("--sort", "prio") == "4 2 3 1"
+    assert ls("--sort", "prio:desc") == "1 3 4 2"
+    assert ls("--sort", "status:desc,task:desc") == "4 3 2 1"
+    assert ls("--sort", "priority,id:desc") == "4 2 3 1"
+    assert ls("--sort", "priority,id") == "2 4 3 1"
+
+    page, truncated, total = query.take(
+        iter([5, 1, 4, 2, 3]), limit=2, key=lambda x: query.Descending(x)
+    )
+    assert page == [5, 4]
+
+    with pytest.raises(AssertionError):
+        ls("--sort", "prio:sideways")
+
+
+@base.setup_create_teardown
+def test_sort_keeps_untyped_cells_last(runner):
+    for idx in range(3):
+        runner(base.argsd("add", f"task {idx}"))
+
+    runner(base.argsd("column", "add", "Points"))
+    runner(base.argsd("update", "1", "Points", "5"))
+    runner(base.argsd("update", "3", "Points", "9"))
+    runner(base.argsd("constraint", "update", "Points", "Type", "int"))
+
+    runner(base.argsd("column", "add", "Size"))
+    runner(base.argsd("constraint", "update", "Size", "Variant", "S|M|L"))
+    runner(base.argsd("update", "1", "Size", "L"))
+    runner(base.argsd("update", "3", "Size", "S"))
+
+    def ls(*args):
+        return runner(base.argsd("ls", "--ids", "--notruncate", *args), capture=True)
+
+    assert ls("--sort", "points") == "1 3 2"
+    assert ls("--sort", "points:desc") == "3 1 2"
+    assert ls("-o", "--sort", "points") == "3 1 2"
+    assert ls("-o", "--sort", "points:desc") == "1 3 2"
+
+    assert ls("--sort", "size") == "3 1 2"
+    assert ls("--sort", "size:desc") == "1 3 2"
+    assert ls("-o", "--sort", "size") == "1 3 2"
@@ -0,0 +1,65 @@
+import os
+import sys
+import subprocess
+
+import base
+import cmds
+import consts
+
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "main.py")
+
+# cumulative import time of cmds for `ls --ids` as a multiple of the time it
+# takes to import tabulate alone, measured at 1.3 to 2 with and without
+# bytecode caches, eagerly importing the lazy modules below takes it over 3
+IMPORT_BUDGET_TABULATES = 3
+
+LAZY_MODULES = ("tabulate", "pyperclip", "sqlite3", "sqlstore", "hashlib", "blueprints", "logo", "shlex")
+
+
+def import_times(*args: str) -> dict[str, int]:
+    """cumulative import time in microseconds of every module imported by a
+    python run, the fastest of three runs"""
+    runs = [single_import_times(*args) for _ in range(3)]
+    return {name: min(times.get(name, 0) for times in runs) for name in runs[0]}
+
+
+def single_import_times(*args: str) -> dict[str, int]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        text=True,
+        # a running daemon would answer the command without importing cmds
+        env={**os.environ, consts.DAEMON_DISABLE_ENV: "1"},
+    )
+    assert result.returncode == 0, result.stderr
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+
+    return times
+
+
+@base.setup_create_teardown
+def test_ls_ids_skips_lazy_imports(runner):
+    times = import_times(MAIN_PATH, *base.argsd("ls", "--ids"))
+
+    assert "cmds" in times
+    assert not [m for m in LAZY_MODULES if m in times]
+
+    budget = IMPORT_BUDGET_TABULATES * import_times("-c", "import tabulate")["tabulate"]
+    assert times["cmds"] < budget, f"importing cmds took {times['cmds']}us, budget {budget}us"
+
+
+@base.setup_teardown
+def test_help_lists_every_command(runner):
+    output = runner(["help"], capture=True)
+    listed = {line.split()[0] for line in output.splitlines() if line.startswith("    ")}
+
+    for cmd_factory in cmds.COMMANDS:
+        assert cmd_factory.__name__.rstrip("_") in listed
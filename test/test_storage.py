@@ -0,0 +1,125 @@
+import os
+import sqlite3
+
+from base import setup_teardown, TEST_RES_PATH
+
+import storage
+import sqlstore
+
+SQLITE_PATH = TEST_RES_PATH + "queue.db"
+CSV_PATH = TEST_RES_PATH + "queue.csv"
+
+
+def sqlite_args(*args):
+    return ("--path", SQLITE_PATH) + args
+
+
+@setup_teardown
+def test_sqlite_crud(runner):
+    runner(sqlite_args("create"))
+    assert storage.backend_for(SQLITE_PATH) == "sqlite"
+
+    runner(sqlite_args("add", "first"))
+    runner(sqlite_args("add", "second", "Priority=High"))
+    runner(sqlite_args("mark", "1", "Done"))
+    runner(sqlite_args("remove", "2"))
+    runner(sqlite_args("add", "third"))
+
+    output = runner(sqlite_args("ls", "--ids"), capture=True)
+    assert output == "3 1"
+
+    taskq = storage.deserialize(SQLITE_PATH)
+    assert taskq.find(1).geti("Status") == "Done"
+    assert taskq.next_id() == 4
+
+
+@setup_teardown
+def test_sqlite_where_pushdown(runner):
+    runner(sqlite_args("create"))
+    runner(sqlite_args("add", "first", "Status=Done"))
+    runner(sqlite_args("add", "second"))
+    runner(sqlite_args("add", "third", "Status=Done", "Priority=High"))
+
+    taskq = storage.deserialize(SQLITE_PATH, where=["status=d"])
+    assert list(taskq.tasks) == [1, 3]
+
+    taskq = storage.deserialize(SQLITE_PATH, where=["status=d", "task=th*"])
+    assert list(taskq.tasks) == [1, 3]
+
+    output = runner(sqlite_args("ls", "--ids", "--where", "status=d", "task=th*"), capture=True)
+    assert output == "3"
+
+    with sqlite3.connect(SQLITE_PATH) as db:
+        plan = db.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM tasks WHERE "
+            + sqlstore.pushdown(taskq, ["status=d"])[0][0],
+            ["Done"],
+        ).fetchall()
+    assert "INDEX" in str(plan)
+
+
+@setup_teardown
+def test_export_import_round_trip(runner):
+    runner(("--path", CSV_PATH, "create"))
+    runner(("--path", CSV_PATH, "add", "first", "Priority=High"))
+    runner(("--path", CSV_PATH, "add", "second"))
+
+    runner(("--path", CSV_PATH, "export", SQLITE_PATH))
+    assert os.path.exists(SQLITE_PATH)
+
+    os.remove(CSV_PATH)
+    runner(("--path", CSV_PATH, "import", SQLITE_PATH))
+
+    original = storage.deserialize(SQLITE_PATH)
+    imported = storage.deserialize(CSV_PATH)
+    assert imported.headers == original.headers
+    assert [t.serialize() for t in imported.tasks.values()] == [
+        t.serialize() for t in original.tasks.values()
+    ]
+
+
+@setup_teardown
+def test_sqlite_archived_tasks_load_lazily(runner):
+    runner(sqlite_args("create"))
+    runner(sqlite_args("add", "first"))
+    runner(sqlite_args("add", "second"))
+    runner(sqlite_args("archive", "1"))
+
+    taskq = storage.deserialize(SQLITE_PATH)
+    assert list(taskq.tasks) == [2]
+
+    assert runner(sqlite_args("ls", "--ids", "--all"), capture=True) == "2 1"
+
+    runner(sqlite_args("column", "add", "Notes"))
+    taskq = storage.deserialize(SQLITE_PATH)
+    taskq.load_archive()
+    assert list(taskq.tasks) == [1, 2]
+
+
+@setup_teardown
+def test_sqlite_column_changes(runner):
+    runner(sqlite_args("create"))
+    runner(sqlite_args("add", "first"))
+    runner(sqlite_args("column", "add", "Owner"))
+    runner(sqlite_args("update", "1", "Owner", "me"))
+    runner(sqlite_args("column", "rename", "Owner", "Assignee"))
+    runner(sqlite_args("column", "remove", "Priority"))
+    runner(sqlite_args("column", "move", "Assignee", "1"))
+
+    taskq = storage.deserialize(SQLITE_PATH)
+    assert taskq.headers == ["Id", "Assignee", "Task", "Status", "Archived"]
+    assert taskq.find(1).geti("Assignee") == "me"
+    assert taskq.find_constraint("Priority") is None
+
+
+@setup_teardown
+def test_sqlite_pk_range_pushdown(runner):
+    runner(sqlite_args("create"))
+    for idx in range(5):
+        runner(sqlite_args("add", f"task {idx}"))
+
+    taskq = storage.deserialize(SQLITE_PATH, where=["id>=2", "id<4"])
+    assert list(taskq.tasks) == [2, 3]
+
+    taskq = storage.deserialize(SQLITE_PATH, whereor=["id=..1", "id>4"])
+    assert list(taskq.tasks) == [1, 5]
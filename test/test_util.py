@@ -0,0 +1,45 @@
+from colorama import Fore
+
+import base
+import util
+
+
+TRUECOLOUR = "\033[38;2;255;128;0m"
+
+
+def test_visual_length_ignores_colours():
+    assert util.find_visual_length_of_line(Fore.RED + "abc" + Fore.RESET) == 3
+    assert util.find_visual_length_of_line(TRUECOLOUR + "abc" + Fore.RESET + "de") == 5
+    assert util.find_visual_length_of_line("plain") == 5
+
+
+def test_truncate_visual_keeps_leading_escapes():
+    line = TRUECOLOUR + "abc" + Fore.RESET + "def"
+    assert util.truncate_visual(line, 2) == TRUECOLOUR + "ab"
+    assert util.truncate_visual(line, 3) == TRUECOLOUR + "abc"
+    assert util.truncate_visual(line, 4) == TRUECOLOUR + "abc" + Fore.RESET + "d"
+    assert util.truncate_visual(line, 10) == line
+
+
+def test_truncate_visual_plain():
+    assert util.truncate_visual("abcdef", 3) == "abc"
+    assert util.truncate_visual("", 3) == ""
+
+
+def test_grid_lines_match_tabulate():
+    headers = [util.clr_surround_fore(h, Fore.GREEN) for h in ("Id", "Task", "Done")]
+    table = [
+        [util.clr_surround_fore("1", Fore.BLUE), " padded ", "True"],
+        [util.clr_surround_fore("12", Fore.BLUE), "with | bar", "False"],
+    ]
+
+    layout = util.grid_layout(table, headers, [None, None, None])
+    assert layout is not None
+    assert list(util.grid_lines(table, headers, *layout)) == util.tabulate_lines(table, headers, None)
+
+
+def test_grid_layout_defers_to_tabulate():
+    assert util.grid_layout([["1.5"], ["2"]], ["n"], [None]) is None
+    assert util.grid_layout([["two\nlines"]], ["n"], [None]) is None
+    assert util.grid_layout([["too long"]], ["n"], [3]) is None
+    assert util.grid_layout([[]], ["n"], [None]) is None